@@ -1,12 +1,25 @@
 from django import forms
 from django.conf.urls import url
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.admin import TabularInline
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
-
-from .models import BotServer, Game, GameConfig, GameException, GameMove, GamePlayer, GameSetup
+from django.utils import timezone
+
+from .models import (
+    BotServer,
+    Dispatch,
+    DispatchStates,
+    Game,
+    GameConfig,
+    GameException,
+    GameMove,
+    GamePlayer,
+    GameSetup,
+    Tournament,
+    TournamentStanding,
+)
 
 
 class PlayerInline(TabularInline):
@@ -16,36 +29,22 @@ class PlayerInline(TabularInline):
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
-    list_display = ("created_at", "id", "state", "loser_display", "winner_display")
-    readonly_fields = ("loser_display", "winner_display", "created_at", "scores")
+    list_display = ("created_at", "id", "state", "loser", "winner", "is_draw")
+    list_select_related = ("loser__player", "winner__player")
+    readonly_fields = ("loser", "winner", "is_draw", "created_at", "scores")
     inlines = [PlayerInline]
     ordering = ('-created_at',)
 
-    def loser_display(self, obj: Game):
-        try:
-            return obj.loser
-        except GameException:
-            return "-"
-
-    def winner_display(self, obj: Game):
-        try:
-            return obj.winner
-        except GameException:
-            return "-"
-
-    loser_display.short_description = "Loser"  # type: ignore
-    winner_display.short_description = "Winner"  # type: ignore
-
 
 @admin.register(GamePlayer)
 class GamePlayerAdmin(admin.ModelAdmin):
-    list_display = ["game", "player", "state"]
+    list_display = ["game", "player", "state", "move_count", "shot_count"]
     list_filter = ["game", "player", "state"]
 
 
 @admin.register(GameMove)
 class GameMoveAdmin(admin.ModelAdmin):
-    list_display = ["id", "player", "x", "y"]
+    list_display = ["id", "player", "x", "y", "result", "turn"]
     list_filter = ["player__game"]
 
 
@@ -55,9 +54,31 @@ class GameSetupAdmin(admin.ModelAdmin):
     list_filter = ["player"]
 
 
+@admin.register(Dispatch)
+class DispatchAdmin(admin.ModelAdmin):
+    list_display = [
+        "game",
+        "state",
+        "attempts",
+        "latency",
+        "created_at",
+        "sent_at",
+        "finished_at",
+        "last_error",
+    ]
+    list_filter = ["state", "server_1", "server_2"]
+    readonly_fields = ["created_at", "sent_at", "finished_at", "latency"]
+    actions = ["retry"]
+
+    def retry(self, request, queryset):
+        queryset.update(state=DispatchStates.PENDING, attempts=0, next_attempt_at=timezone.now())
+
+    retry.short_description = "Retry selected dispatches"  # type: ignore
+
+
 @admin.register(BotServer)
 class BotServerAdmin(admin.ModelAdmin):
-    list_display = ["user", "server_address"]
+    list_display = ["user", "server_address", "max_concurrent_games"]
 
 
 @admin.register(GameConfig)
@@ -67,12 +88,23 @@ class GameConfigAdmin(admin.ModelAdmin):
 
     def start_game(self, request, pk):
         config = get_object_or_404(GameConfig, pk=pk)
-        game = config.create_game(request.build_absolute_uri("/"),)
+        try:
+            game = config.create_game(request.build_absolute_uri("/"),)
+        except GameException as e:
+            messages.error(request, str(e))
+            return HttpResponseRedirect(
+                reverse("admin:cloudships_gameconfig_change", args=(config.pk,))
+            )
         return HttpResponseRedirect(reverse("admin:cloudships_game_change", args=(game.pk,)))
 
     def start_all_games(self, request, pk):
         config = get_object_or_404(GameConfig, pk=pk)
-        config.create_all_games(request.build_absolute_uri("/"))
+        try:
+            games = config.create_all_games(request.build_absolute_uri("/"))
+        except GameException as e:
+            messages.error(request, str(e))
+        else:
+            messages.info(request, f"Created {len(games)} games, queued for dispatch")
         return HttpResponseRedirect(
             reverse("admin:cloudships_gameconfig_change", args=(config.pk,))
         )
@@ -91,3 +123,44 @@ class GameConfigAdmin(admin.ModelAdmin):
                 name="start-game",
             ),
         ] + super().get_urls()
+
+
+class StandingInline(TabularInline):
+    model = TournamentStanding
+    extra = 0
+    can_delete = False
+    fields = ["server", "played", "wins", "draws", "losses", "points"]
+    readonly_fields = fields
+    ordering = ["-points", "-wins", "server_id"]
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Tournament)
+class TournamentAdmin(admin.ModelAdmin):
+    list_display = ["id", "name", "games_per_pairing", "created_at", "started_at"]
+    filter_horizontal = ["servers"]
+    readonly_fields = ["started_at", "progress"]
+    inlines = [StandingInline]
+
+    def start_tournament(self, request, pk):
+        tournament = get_object_or_404(Tournament, pk=pk)
+        try:
+            games = tournament.start(request.build_absolute_uri("/"))
+        except GameException as e:
+            messages.error(request, str(e))
+        else:
+            messages.info(request, f"Created {len(games)} games, queued for dispatch")
+        return HttpResponseRedirect(
+            reverse("admin:cloudships_tournament_change", args=(tournament.pk,))
+        )
+
+    def get_urls(self):
+        return [
+            url(
+                r"^(\d+)/start_tournament/$",
+                self.admin_site.admin_view(self.start_tournament),
+                name="start-tournament",
+            ),
+        ] + super().get_urls()
@@ -0,0 +1,18 @@
+"""
+ASGI config, an alternative to wsgi.py that serves the busiest bot endpoints asynchronously.
+
+Run it with uvicorn, e.g. ``uvicorn cloudships.asgi:application``.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+
+django_application = get_asgi_application()
+
+# needs the apps loaded by get_asgi_application
+from cloudships.async_api import FastPaths  # noqa: E402 isort:skip
+
+application = FastPaths(django_application)
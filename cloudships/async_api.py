@@ -0,0 +1,219 @@
+"""
+Async versions of the endpoints bots hit the most, for running under ASGI (see asgi.py).
+
+Django 3.0 can't run async views, so FastPaths answers these requests itself before they reach
+Django, and hands everything else (including anything it doesn't like the look of) to the
+Django application. Database work runs in the event loop's thread pool, and its connection is
+closed afterwards unless CONN_MAX_AGE keeps it for the next call on that thread. Either way a
+waiting request holds neither a thread nor a connection.
+"""
+import json
+import re
+import time
+import typing as t
+import uuid
+from functools import wraps
+from urllib.parse import parse_qsl
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.http.request import split_domain_port, validate_host
+from rest_framework import exceptions
+
+from .authentication import CachedTokenAuthentication, tokens
+from .db import check_connections, mark_idle
+from .metrics import RequestStats, new_stats, record, track
+from .models import GameException, GamePlayer
+from .notify import AsyncEvent, game_states
+from .views import AttackSerializer, WaitSerializer, game_state
+
+GAME = r"^/api/game/(?P<game_id>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})"
+
+Response = t.Tuple[int, dict]
+
+
+def run_sync(func, stats: RequestStats):
+    """
+    Run a function that uses the database in the thread pool, counting its queries in `stats`.
+    """
+
+    def call(*args, **kwargs):
+        close_old_connections()
+        check_connections()
+        try:
+            with track(stats):
+                return func(*args, **kwargs)
+        finally:
+            mark_idle()
+            close_old_connections()
+
+    return sync_to_async(wraps(func)(call), thread_sensitive=False)
+
+
+class Request(object):
+    def __init__(self, scope, body: bytes, kwargs: dict):
+        self.scope = scope
+        self.body = body
+        self.kwargs = kwargs
+        self.stats = new_stats()
+        self.headers = {name.decode("latin1"): value for name, value in scope["headers"]}
+
+    @property
+    def query_params(self) -> dict:
+        return dict(parse_qsl(self.scope["query_string"].decode("latin1")))
+
+    @property
+    def data(self):
+        try:
+            return json.loads(self.body)
+        except ValueError as e:
+            raise exceptions.ParseError(f"JSON parse error - {e}")
+
+
+async def authenticate(request: Request):
+    """
+    The same checks as CachedTokenAuthentication and IsAuthenticated.
+    """
+    auth = request.headers.get("authorization", b"").split()
+    if not auth or auth[0].lower() != b"token":
+        raise exceptions.NotAuthenticated()
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed("Invalid token header.")
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed("Invalid token header.")
+    credentials = tokens.get(key)
+    if credentials is None:
+        credentials = await run_sync(
+            CachedTokenAuthentication().authenticate_credentials, request.stats
+        )(key)
+    return credentials[0]
+
+
+async def game_status(request: Request, user) -> Response:
+    state = await run_sync(game_state, request.stats)(request.kwargs["game_id"], user)
+    if state is None:
+        raise exceptions.NotFound()
+    return 200, dict(game=state)
+
+
+async def wait_for_game(request: Request, user) -> Response:
+    form = WaitSerializer(data=request.query_params)
+    if not form.is_valid():
+        return 400, dict(errors=form.errors)
+    game_id = request.kwargs["game_id"]
+    with game_states.subscribe(game_id, AsyncEvent()) as changed:
+        state = await run_sync(game_state, request.stats)(game_id, user)
+        if state is None:
+            raise exceptions.NotFound()
+        if state["state"] == form.validated_data.get("state"):
+            if await changed.wait(form.validated_data["timeout"]):
+                state = await run_sync(game_state, request.stats)(game_id, user)
+    return 200, dict(game=state)
+
+
+async def attack(request: Request, user) -> Response:
+    form = AttackSerializer(data=request.data)
+    if not form.is_valid():
+        return 400, dict(errors=form.errors)
+    try:
+        result = await run_sync(GamePlayer.objects.make_move, request.stats)(
+            request.kwargs["game_id"], user, form.validated_data["x"], form.validated_data["y"]
+        )
+    except GameException as e:
+        return 400, dict(errors=[str(e)])
+    return 200, dict(result=result, **form.validated_data)
+
+
+ROUTES = [
+    ("GET", re.compile(GAME + r"/$"), game_status),
+    ("GET", re.compile(GAME + r"/wait/$"), wait_for_game),
+    ("POST", re.compile(GAME + r"/attack/$"), attack),
+]
+
+
+class FastPaths(object):
+    """
+    ASGI application serving ROUTES itself and passing everything else on to `app`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route = self.route(scope) if scope["type"] == "http" else None
+        if route is None:
+            return await self.app(scope, receive, send)
+        handler, kwargs = route
+        start = time.perf_counter()
+        request = Request(scope, await self.read_body(receive), kwargs)
+        try:
+            user = await authenticate(request)
+            status, data = await handler(request, user)
+        except exceptions.APIException as e:
+            status, data = e.status_code, dict(detail=e.detail)
+        headers = []
+        if status == 401:
+            headers.append((b"www-authenticate", CachedTokenAuthentication.keyword.encode()))
+        serialize_start = time.perf_counter()
+        body = json.dumps(data, cls=DjangoJSONEncoder).encode()
+        request.stats.serialization_time += time.perf_counter() - serialize_start
+        await self.respond(send, status, body, headers)
+        # the same view names as MetricsMiddleware
+        record(handler.__name__, status, time.perf_counter() - start, request.stats)
+
+    def route(self, scope) -> t.Optional[t.Tuple[t.Callable, dict]]:
+        headers = dict(scope["headers"])
+        if not self.allowed(scope, headers):
+            # let Django reject or redirect it
+            return None
+        for method, pattern, handler in ROUTES:
+            match = pattern.match(scope["path"])
+            if match and scope["method"] == method:
+                if method == "POST" and not headers.get(b"content-type", b"").startswith(
+                    b"application/json"
+                ):
+                    return None
+                return handler, dict(game_id=uuid.UUID(match["game_id"]))
+        return None
+
+    @staticmethod
+    def allowed(scope, headers) -> bool:
+        host, _port = split_domain_port(headers.get(b"host", b"").decode("latin1"))
+        allowed_hosts = settings.ALLOWED_HOSTS
+        if settings.DEBUG and not allowed_hosts:
+            allowed_hosts = [".localhost", "127.0.0.1", "[::1]"]
+        if not host or not validate_host(host, allowed_hosts):
+            return False
+        if settings.SECURE_SSL_REDIRECT:
+            forwarded = headers.get(b"x-forwarded-proto", b"").decode("latin1")
+            return scope.get("scheme") == "https" or forwarded == "https"
+        return True
+
+    @staticmethod
+    async def read_body(receive) -> bytes:
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        return body
+
+    @staticmethod
+    async def respond(send, status: int, body: bytes, headers: t.List[t.Tuple[bytes, bytes]]):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    *headers,
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import LRUCache
+
+# token key -> (user, token)
+tokens: LRUCache[str, tuple] = LRUCache(
+    max_size=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers tokens for TOKEN_CACHE_TTL seconds, so bots don't pay
+    for the token and user lookup on every request.
+    """
+
+    def authenticate_credentials(self, key):
+        credentials = tokens.get(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            tokens.set(key, credentials)
+        return credentials
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance: Token, **kwargs):
+    tokens.discard(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_tokens(sender, instance: User, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    # users are rarely changed, and might have been deactivated
+    tokens.clear()
@@ -0,0 +1,255 @@
+"""
+Helpers for driving the API in-process for benchmarks, see the benchmark_attack and loadtest
+commands.
+"""
+
+import random
+import statistics
+import threading
+import time
+import typing as t
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from . import bitboard
+from .dispatcher import generate_signed_id
+from .models import BotServer, Game, GameConfig, PlayerStates, ShipConfig
+
+
+class Timings(object):
+    """
+    Latency (in milliseconds) and query count of each request made through `request`.
+    """
+
+    def __init__(self):
+        self.latencies: t.List[float] = []
+        self.queries: t.List[int] = []
+
+    @contextmanager
+    def request(self) -> t.Iterator[None]:
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            yield
+            self.latencies.append((time.perf_counter() - start) * 1000)
+        self.queries.append(queries)
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def summary(self) -> t.Dict[str, float]:
+        return dict(
+            requests=len(self.latencies),
+            p50=self.percentile(50),
+            p99=self.percentile(99),
+            mean=statistics.mean(self.latencies),
+            queries=statistics.mean(self.queries),
+        )
+
+
+def api_client(user: t.Optional[User] = None) -> Client:
+    headers = dict(
+        HTTP_HOST=settings.ALLOWED_HOSTS[0],
+        # skip the https redirect when running against production settings
+        HTTP_X_FORWARDED_PROTO="https",
+    )
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        headers["HTTP_AUTHORIZATION"] = f"Token {token.key}"
+    return Client(**headers)
+
+
+@contextmanager
+def benchmark_servers(count: int) -> t.Iterator[t.List[BotServer]]:
+    """
+    Throwaway bot servers (and their users), deleted along with their games afterwards.
+    """
+    prefix = f"benchmark-{uuid.uuid4().hex[:8]}"
+    servers = [
+        BotServer.objects.create(
+            user=User.objects.create(username=f"{prefix}-{i}"), server_address="http://localhost/"
+        )
+        for i in range(count)
+    ]
+    try:
+        yield servers
+    finally:
+        GameConfig.objects.filter(player_1__in=servers).delete()
+        User.objects.filter(username__startswith=prefix).delete()
+
+
+class ConnectionSampler(object):
+    """
+    Samples the number of connections to the database from a thread of its own while running.
+
+    pg_stat_activity counts the server's connections, so through pgbouncer this is the pool's
+    server connections rather than the clients'.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.samples: t.List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "ConnectionSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()"
+                    )
+                    self.samples.append(cursor.fetchone()[0])
+                self._stop.wait(self.interval)
+        finally:
+            connection.close()
+
+    def summary(self) -> t.Dict[str, float]:
+        return dict(peak=max(self.samples), mean=statistics.mean(self.samples))
+
+
+def random_ships(
+    board_size: int, ship_configs: t.Sequence[ShipConfig], rng: random.Random
+) -> t.List[dict]:
+    """
+    A valid placement for the ships, with no two ships touching.
+    """
+    lengths = sorted((cfg.length for cfg in ship_configs for _ in range(cfg.count)), reverse=True)
+    while True:
+        occupied = 0
+        ships = []
+        for length in lengths:
+            options = [
+                (x, y, orientation)
+                for orientation in (bitboard.HORIZONTAL, bitboard.VERTICAL)
+                for x in range(board_size)
+                for y in range(board_size)
+                if bitboard.fits(x, y, length, orientation, board_size)
+                and not occupied & bitboard.ship(x, y, length, orientation, board_size)
+            ]
+            if not options:
+                # painted ourselves into a corner, start again
+                break
+            x, y, orientation = rng.choice(options)
+            occupied |= bitboard.dilate(
+                bitboard.ship(x, y, length, orientation, board_size), board_size
+            )
+            ships.append(dict(x=x, y=y, length=length, orientation=orientation))
+        else:
+            return ships
+
+
+class Shooter(object):
+    """
+    Picks attacks for one player: random cells until something is hit, then its neighbours.
+    """
+
+    def __init__(self, board_size: int, ship_cells: int, rng: random.Random):
+        self.board_size = board_size
+        self.remaining = ship_cells
+        self.untried = [(x, y) for x in range(board_size) for y in range(board_size)]
+        rng.shuffle(self.untried)
+        self.tried: t.Set[t.Tuple[int, int]] = set()
+        self.targets: t.List[t.Tuple[int, int]] = []
+
+    @property
+    def done(self) -> bool:
+        return self.remaining == 0
+
+    def next(self) -> t.Tuple[int, int]:
+        while self.targets:
+            cell = self.targets.pop()
+            if cell not in self.tried:
+                return cell
+        while True:
+            cell = self.untried.pop()
+            if cell not in self.tried:
+                return cell
+
+    def record(self, x: int, y: int, result: str):
+        self.tried.add((x, y))
+        if result == "MISS":
+            return
+        self.remaining -= 1
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < self.board_size and 0 <= ny < self.board_size:
+                self.targets.append((nx, ny))
+
+
+class LoadTest(object):
+    """
+    Plays games through the API like a pair of bots would, timing each endpoint.
+    """
+
+    def __init__(self):
+        self.timings: t.Dict[str, Timings] = defaultdict(Timings)
+        self.errors: t.List[str] = []
+
+    def call(self, endpoint: str, method, path: str, data=None):
+        with self.timings[endpoint].request():
+            response = method(path, data, content_type="application/json")
+        if response.status_code != 200:
+            self.errors.append(f"{endpoint} {path}: {response.status_code} {response.content!r}")
+            return None
+        return response.json()
+
+    def play(self, game: Game, servers: t.Sequence[BotServer], seed: int):
+        rng = random.Random(seed)
+        config = game.config
+        clients = [api_client(server.user) for server in servers]
+        url = f"/api/game/{game.pk}"
+        for client in clients:
+            self.call("join", client.post, f"{url}/join/")
+        for client in clients:
+            ships = random_ships(config.board_size, config.ships, rng)
+            self.call("place", client.post, f"{url}/place/", ships)
+        for client in clients:
+            self.call("status", client.get, f"{url}/")
+
+        ship_cells = sum(cfg.length * cfg.count for cfg in config.ships)
+        shooters = [Shooter(config.board_size, ship_cells, rng) for _ in clients]
+        while not all(shooter.done for shooter in shooters):
+            for client, shooter in zip(clients, shooters):
+                if shooter.done:
+                    continue
+                x, y = shooter.next()
+                response = self.call("attack", client.post, f"{url}/attack/", dict(x=x, y=y))
+                if response is None:
+                    return
+                shooter.record(x, y, response["result"])
+
+        players = [
+            dict(username=server.user.username, state=PlayerStates.FINISHED) for server in servers
+        ]
+        # the dispatcher's callback, which isn't authenticated
+        self.call(
+            "finish",
+            api_client().post,
+            f"{url}/finish/",
+            dict(players=players, secret=generate_signed_id(game.pk)),
+        )
+
+    def summary(self) -> t.Dict[str, t.Dict[str, float]]:
+        return {endpoint: timing.summary() for endpoint, timing in sorted(self.timings.items())}
@@ -0,0 +1,103 @@
+"""
+Bitboards for square game boards.
+
+A board of ``size`` is a plain python int with bit ``y * size + x`` set for each
+occupied cell, so unions, intersections and "is this ship sunk" checks are single
+integer operations instead of set arithmetic.
+"""
+import typing as t
+
+VERTICAL = "vertical"
+HORIZONTAL = "horizontal"
+
+
+def full(size: int) -> int:
+    return (1 << (size * size)) - 1
+
+
+def index(x: int, y: int, size: int) -> int:
+    return y * size + x
+
+
+def cell(x: int, y: int, size: int) -> int:
+    return 1 << index(x, y, size)
+
+
+def column(size: int, length: int) -> int:
+    """
+    `length` cells stacked vertically from the top left corner.
+    """
+    # 1 + 2^size + 2^(2*size) + ... as a geometric series
+    return ((1 << (size * length)) - 1) // ((1 << size) - 1)
+
+
+def row(length: int) -> int:
+    """
+    `length` cells side by side from the top left corner.
+    """
+    return (1 << length) - 1
+
+
+def fits(x: int, y: int, length: int, orientation: str, size: int) -> bool:
+    if x < 0 or y < 0 or length < 1:
+        return False
+    if orientation == VERTICAL:
+        return x < size and y + length <= size
+    return y < size and x + length <= size
+
+
+def ship(x: int, y: int, length: int, orientation: str, size: int) -> int:
+    """
+    Mask of the cells covered by a ship. The ship must fit on the board (see `fits`).
+    """
+    if orientation == VERTICAL:
+        return column(size, length) << index(x, y, size)
+    return row(length) << index(x, y, size)
+
+
+def shift_east(mask: int, size: int) -> int:
+    # anything that wrapped into the first column came off the east edge
+    return (mask << 1) & ~column(size, size) & full(size)
+
+
+def shift_west(mask: int, size: int) -> int:
+    return (mask >> 1) & ~(column(size, size) << (size - 1))
+
+
+def shift_south(mask: int, size: int) -> int:
+    return (mask << size) & full(size)
+
+
+def shift_north(mask: int, size: int) -> int:
+    return mask >> size
+
+
+def dilate(mask: int, size: int) -> int:
+    """
+    Grow a mask by one cell in every direction, diagonals included.
+    """
+    wide = mask | shift_east(mask, size) | shift_west(mask, size)
+    return wide | shift_north(wide, size) | shift_south(wide, size)
+
+
+def halo(mask: int, size: int) -> int:
+    """
+    Cells touching a mask (diagonals included) that are not part of it.
+    """
+    return dilate(mask, size) & ~mask
+
+
+def count(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+def indexes(mask: int) -> t.Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def cells(mask: int, size: int) -> t.Iterator[t.Tuple[int, int]]:
+    for i in indexes(mask):
+        yield i % size, i // size
@@ -0,0 +1,98 @@
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+K = t.TypeVar("K")
+V = t.TypeVar("V")
+
+
+class LRUCache(t.Generic[K, V]):
+    """
+    Thread safe, process local LRU. Entries older than `ttl` seconds are treated as missing.
+    """
+
+    def __init__(self, max_size: int, ttl: t.Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[K, t.Tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: K) -> t.Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: K):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedCache(t.Generic[K, V]):
+    """
+    The same interface as LRUCache over one of Django's caches, so every process sees the same
+    entries. Values are pickled, so a changed value has to be `set` again.
+    """
+
+    def __init__(self, alias: str, prefix: str, ttl: t.Optional[float] = None):
+        self.alias = alias
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, key: K) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        return ":".join([self.prefix, *map(str, parts)])
+
+    def get(self, key: K) -> t.Optional[V]:
+        return self.cache.get(self.key(key))
+
+    def set(self, key: K, value: V):
+        self.cache.set(self.key(key), value, self.ttl)
+
+    def add(self, key: K, value: V) -> bool:
+        """
+        Set `key` only if it isn't already set.
+        """
+        return self.cache.add(self.key(key), value, self.ttl)
+
+    def discard(self, key: K):
+        self.cache.delete(self.key(key))
+
+    def clear(self):
+        # clears everything in the cache, not just this prefix, so give it a cache of its own
+        self.cache.clear()
+
+
+def game_cache(prefix: str, max_size: int):
+    """
+    A cache shared by every process through settings.GAME_CACHE if it's set, otherwise an
+    LRUCache in this process.
+    """
+    if settings.GAME_CACHE:
+        return SharedCache(settings.GAME_CACHE, prefix, ttl=settings.GAME_CACHE_TTL)
+    return LRUCache(max_size=max_size)
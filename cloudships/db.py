@@ -0,0 +1,46 @@
+"""
+Health checks for persistent database connections (CONN_MAX_AGE).
+
+A connection that has sat idle between requests may have been dropped by Postgres, Cloud SQL or
+pgbouncer in the meantime. Django 3.0 only finds out when the next query fails, so check idle
+connections before handing them to a request.
+"""
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+def check_connections():
+    """
+    Close open connections that have been idle for DATABASE_HEALTH_CHECK_IDLE seconds and don't
+    work any more, so they're reopened on first use.
+    """
+    now = time.monotonic()
+    for conn in connections.all():
+        if conn.connection is None:
+            continue
+        idle_since = getattr(conn, "idle_since", None)
+        if idle_since is not None and now - idle_since < settings.DATABASE_HEALTH_CHECK_IDLE:
+            continue
+        if not conn.is_usable():
+            conn.close()
+
+
+def mark_idle():
+    now = time.monotonic()
+    for conn in connections.all():
+        if conn.connection is not None:
+            conn.idle_since = now
+
+
+class ConnectionHealthMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        check_connections()
+        try:
+            return self.get_response(request)
+        finally:
+            mark_idle()
@@ -1,12 +1,18 @@
+import threading
+import time
 import typing as t
 
 import requests
 from django.conf import settings
 from django.utils.crypto import constant_time_compare, get_random_string, salted_hmac
+from requests.adapters import HTTPAdapter
 
 if t.TYPE_CHECKING:
     from .models import BotServer, Game
 
+_session: t.Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
 
 def generate_signed_id(game_id):
     salt = get_random_string(length=8)
@@ -19,20 +25,43 @@ def verify_game_secret(game_id, secret):
     return constant_time_compare(hmac, salted_hmac(salt, str(game_id)).hexdigest())
 
 
-def dispatch(callback, game: "Game", server_1: "BotServer", server_2: "BotServer"):
+def get_session() -> requests.Session:
+    """
+    A shared session so dispatches reuse connections to the dispatcher.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=settings.DISPATCH_CONCURRENCY)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def build_payload(callback, game: "Game", server_1: "BotServer", server_2: "BotServer") -> dict:
     if settings.DEBUG:
         # HACK - internal ports require internal thinking
         callback = "http://django"
-    response = requests.post(
-        settings.DISPATCH_URL,
-        json={
-            "players": [
-                {"server_url": server_1.server_address, "username": server_1.user.username},
-                {"server_url": server_2.server_address, "username": server_2.user.username},
-            ],
-            "game_id": str(game.pk),
-            "callback_url": callback,
-            "secret": generate_signed_id(game.pk),
-        },
+    return {
+        "players": [
+            {"server_url": server_1.server_address, "username": server_1.user.username},
+            {"server_url": server_2.server_address, "username": server_2.user.username},
+        ],
+        "game_id": str(game.pk),
+        "callback_url": callback,
+        "secret": generate_signed_id(game.pk),
+    }
+
+
+def send(payload: dict) -> float:
+    """
+    Post a payload to the dispatcher, returning how long it took in milliseconds.
+    """
+    start = time.perf_counter()
+    response = get_session().post(
+        settings.DISPATCH_URL, json=payload, timeout=settings.DISPATCH_TIMEOUT
     )
     response.raise_for_status()
+    return (time.perf_counter() - start) * 1000
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from cloudships.models import Game, GamePlayer, GameStates
+
+
+class Command(BaseCommand):
+    help = "Store the outcome of finished games that were played before results were recorded"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, batch_size: int, **options):
+        pending = Game.objects.filter(state=GameStates.FINISHED, is_draw__isnull=True).order_by(
+            "created_at"
+        )
+        total = pending.count()
+        done = 0
+        while True:
+            # every processed game gets an is_draw, so the next batch always starts fresh
+            games = list(
+                pending.prefetch_related(models.Prefetch("players", to_attr="prefetched_players"))[
+                    :batch_size
+                ]
+            )
+            if not games:
+                break
+            players = []
+            with transaction.atomic():
+                for game in games:
+                    game.compute_result(game.prefetched_players)
+                    players.extend(game.prefetched_players)
+                Game.objects.bulk_update(games, ["loser", "winner", "is_draw"])
+                GamePlayer.objects.bulk_update(players, ["move_count", "shot_count"])
+            done += len(games)
+            self.stdout.write(f"Backfilled {done}/{total} games")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {done} games"))
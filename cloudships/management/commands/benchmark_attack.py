@@ -0,0 +1,76 @@
+import math
+
+from django.core.management.base import BaseCommand
+
+from cloudships.authentication import tokens
+from cloudships.benchmark import Timings, api_client, benchmark_servers
+from cloudships.models import (
+    Game,
+    GameConfig,
+    GameMove,
+    GameStates,
+    ShipConfig,
+    attackers,
+    board_indexes,
+)
+
+
+class Command(BaseCommand):
+    help = "Time attacks through the API as the number of moves per player grows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--moves", type=int, default=1000, help="Attacks per player")
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Also time attacks with every cache cleared first, as a baseline",
+        )
+
+    def handle(self, *args, moves: int, cold: bool, **options):
+        modes = ["warm", "cold"] if cold else ["warm"]
+        with benchmark_servers(2) as servers:
+            for mode in modes:
+                timings = self.play(servers, moves, cold=mode == "cold")
+                self.report(mode, timings)
+
+    def play(self, servers, moves: int, cold: bool):
+        # every attack has to land somewhere new
+        board_size = max(10, math.ceil(math.sqrt(moves)))
+        config = GameConfig.objects.create_config(board_size, [ShipConfig(length=2, count=1)])
+        config.player_1, config.player_2 = servers
+        config.save()
+        (game,) = config.build_games(1)
+        clients = [api_client(server.user) for server in servers]
+        ship = [dict(x=0, y=0, length=2, orientation="horizontal")]
+        for client in clients:
+            client.post(f"/api/game/{game.pk}/place/", ship, content_type="application/json")
+        assert Game.objects.get(pk=game.pk).state == GameStates.ATTACK_PHASE
+
+        # start from the far corner so nobody sinks the ship until the end
+        cells = [(i % board_size, i // board_size) for i in reversed(range(board_size ** 2))]
+        timings = {quartile: Timings() for quartile in range(4)}
+        for n, (x, y) in enumerate(cells[:moves]):
+            for client in clients:
+                if cold:
+                    board_indexes.clear()
+                    attackers.clear()
+                    tokens.clear()
+                with timings[n * 4 // moves].request():
+                    response = client.post(
+                        f"/api/game/{game.pk}/attack/",
+                        dict(x=x, y=y),
+                        content_type="application/json",
+                    )
+                assert response.status_code == 200, response.content
+        assert GameMove.objects.filter(player__game=game).count() == moves * 2
+        return timings
+
+    def report(self, mode: str, timings):
+        self.stdout.write(f"{mode}:")
+        for quartile, timing in timings.items():
+            summary = timing.summary()
+            self.stdout.write(
+                f"  moves {quartile * 25:>3}-{(quartile + 1) * 25}%: "
+                f"p50 {summary['p50']:.2f}ms p99 {summary['p99']:.2f}ms "
+                f"mean {summary['mean']:.2f}ms, {summary['queries']:.1f} queries/attack"
+            )
@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from cloudships import dispatcher
+from cloudships.models import Dispatch
+
+
+class Command(BaseCommand):
+    help = "Send queued games to the dispatcher, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=settings.DISPATCH_CONCURRENCY)
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once nothing is due instead of polling"
+        )
+
+    def handle(self, *args, concurrency: int, poll_interval: float, once: bool, **options):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                claimed = Dispatch.objects.claim(
+                    limit=concurrency,
+                    lease=settings.DISPATCH_TIMEOUT * 2,
+                    slot_timeout=settings.DISPATCH_SLOT_TIMEOUT,
+                )
+                if not claimed:
+                    if once:
+                        return
+                    time.sleep(poll_interval)
+                    continue
+                for dispatch, outcome in zip(
+                    claimed, pool.map(self.send, [d.payload for d in claimed])
+                ):
+                    self.record(dispatch, outcome)
+                close_old_connections()
+
+    @staticmethod
+    def send(payload: dict):
+        try:
+            return dispatcher.send(payload)
+        except requests.RequestException as e:
+            return e
+
+    def record(self, dispatch: Dispatch, outcome):
+        if isinstance(outcome, Exception):
+            dispatch.mark_failed(
+                outcome,
+                max_attempts=settings.DISPATCH_MAX_ATTEMPTS,
+                retry_delay=settings.DISPATCH_RETRY_DELAY,
+            )
+            self.stderr.write(
+                f"{dispatch.game_id}: attempt {dispatch.attempts} failed ({outcome}), "
+                f"{dispatch.get_state_display().lower()}"
+            )
+        else:
+            dispatch.mark_sent(latency=outcome)
+            self.stdout.write(f"{dispatch.game_id}: sent in {outcome:.0f}ms")
@@ -0,0 +1,129 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cloudships.benchmark import ConnectionSampler, LoadTest, benchmark_servers
+from cloudships.models import GameConfig, ShipConfig
+
+# the README's formats for each board size
+FORMATS = {
+    10: [ShipConfig(5, 1), ShipConfig(4, 1), ShipConfig(3, 2), ShipConfig(2, 1)],
+    20: [ShipConfig(1, 10), ShipConfig(4, 1)],
+    30: [ShipConfig(5, 2), ShipConfig(4, 2), ShipConfig(3, 4), ShipConfig(2, 2)],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Play games concurrently through the API, reporting latency and queries per endpoint "
+        "and games per second and database connections for each board size"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=8, help="Games per board size")
+        parser.add_argument("--concurrency", type=int, default=4, help="Games played at once")
+        parser.add_argument("--sizes", type=int, nargs="+", default=sorted(FORMATS))
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results to this json file")
+        parser.add_argument(
+            "--baseline",
+            help="Fail if the results are worse than this file (from --output) beyond --tolerance",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=1.5,
+            help="How many times slower than the baseline p99 and games/s is still a pass",
+        )
+
+    def handle(
+        self, *args, games, concurrency, sizes, seed, output, baseline, tolerance, **options
+    ):
+        results = {}
+        errors = []
+        with benchmark_servers(2) as servers:
+            for size in sizes:
+                load, results[str(size)] = self.run(servers, size, games, concurrency, seed)
+                self.report(size, results[str(size)])
+                errors.extend(load.errors)
+
+        if output:
+            with open(output, "w") as f:
+                json.dump(results, f, indent=2)
+        if errors:
+            raise CommandError("\n".join([f"{len(errors)} requests failed:", *errors[:20]]))
+        if baseline:
+            with open(baseline) as f:
+                regressions = self.compare(json.load(f), results, tolerance)
+            if regressions:
+                raise CommandError("\n".join(["Slower than the baseline:", *regressions]))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def run(self, servers, size: int, games: int, concurrency: int, seed: int):
+        config = GameConfig.objects.create_config(size, FORMATS.get(size, FORMATS[10]))
+        config.player_1, config.player_2 = servers
+        config.save()
+        load = LoadTest()
+
+        def play(n_game):
+            n, game = n_game
+            try:
+                load.play(game, servers, seed=seed + n)
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ConnectionSampler() as connections, ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(play, enumerate(config.build_games(games))))
+        elapsed = time.perf_counter() - start
+        return (
+            load,
+            dict(
+                games_per_second=games / elapsed,
+                connections=connections.summary(),
+                endpoints=load.summary(),
+            ),
+        )
+
+    def report(self, size: int, result: dict):
+        self.stdout.write(
+            f"{size}x{size}: {result['games_per_second']:.2f} games/s, "
+            f"{result['connections']['peak']} database connections at most "
+            f"({result['connections']['mean']:.1f} on average)"
+        )
+        for endpoint, summary in result["endpoints"].items():
+            self.stdout.write(
+                f"  {endpoint:<8} {summary['requests']:>6} requests  p50 {summary['p50']:6.2f}ms  "
+                f"p99 {summary['p99']:6.2f}ms  {summary['queries']:.2f} queries/request"
+            )
+
+    @staticmethod
+    def compare(baseline: dict, results: dict, tolerance: float):
+        regressions = []
+        for size, result in results.items():
+            before = baseline.get(size)
+            if before is None:
+                continue
+            if result["games_per_second"] * tolerance < before["games_per_second"]:
+                regressions.append(
+                    f"{size}x{size}: {before['games_per_second']:.2f} -> "
+                    f"{result['games_per_second']:.2f} games/s"
+                )
+            for endpoint, summary in result["endpoints"].items():
+                old = before["endpoints"].get(endpoint)
+                if old is None:
+                    continue
+                # query counts are deterministic, so any increase is a regression
+                if summary["queries"] > old["queries"] + 0.01:
+                    regressions.append(
+                        f"{size}x{size} {endpoint}: {old['queries']:.2f} -> "
+                        f"{summary['queries']:.2f} queries/request"
+                    )
+                if summary["p99"] > old["p99"] * tolerance:
+                    regressions.append(
+                        f"{size}x{size} {endpoint}: p99 {old['p99']:.2f} -> {summary['p99']:.2f}ms"
+                    )
+        return regressions
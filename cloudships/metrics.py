@@ -0,0 +1,202 @@
+"""
+Per view request metrics, exposed in the Prometheus text format at /metrics/.
+
+MetricsMiddleware records every API request, and TimedSerializer counts the time views spend
+serializing their responses. The ASGI fast paths (async_api.py) bypass Django's middleware and
+record their own. Metrics are per process.
+"""
+import logging
+import threading
+import time
+import typing as t
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import serializers
+
+log = logging.getLogger(__name__)
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERIES = (0, 1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50, 100)
+
+_local = threading.local()
+
+
+class Histogram(object):
+    """
+    Thread safe Prometheus style histogram, labelled by view.
+    """
+
+    def __init__(self, name: str, help: str, buckets: t.Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # per view: a count for each bucket (not cumulative) plus one for +Inf, and the sum
+        self._counts: t.Dict[str, t.List[int]] = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self._sums: t.Dict[str, float] = defaultdict(float)
+
+    def observe(self, view: str, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[view][i] += 1
+            self._sums[view] += value
+
+    def render(self) -> t.List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [
+                (view, list(counts), self._sums[view]) for view, counts in self._counts.items()
+            ]
+        for view, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{view}"}} {total}')
+            lines.append(f'{self.name}_count{{view="{view}"}} {cumulative}')
+        return lines
+
+
+class Counter(object):
+    """
+    Thread safe Prometheus style counter, labelled by view and response status.
+    """
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._counts: t.Dict[t.Tuple[str, int], int] = defaultdict(int)
+
+    def inc(self, view: str, status: int):
+        with self._lock:
+            self._counts[view, status] += 1
+
+    def render(self) -> t.List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._counts.items())
+        for (view, status), count in snapshot:
+            lines.append(f'{self.name}{{view="{view}",status="{status}"}} {count}')
+        return lines
+
+
+requests = Counter("cloudships_requests_total", "Requests handled")
+request_time = Histogram("cloudships_request_seconds", "Wall time of a request", SECONDS)
+query_count = Histogram("cloudships_request_queries", "Database queries per request", QUERIES)
+query_time = Histogram(
+    "cloudships_request_query_seconds", "Time spent in database queries per request", SECONDS
+)
+serialization_time = Histogram(
+    "cloudships_request_serialization_seconds",
+    "Time spent serializing the response per request",
+    SECONDS,
+)
+
+
+class RequestStats(object):
+    """
+    Database and serialization time for one request. Also a connection.execute_wrapper.
+    """
+
+    def __init__(self, record_sql: bool = False):
+        self.queries = 0
+        self.query_time = 0.0
+        self.serialization_time = 0.0
+        self.sql: t.Optional[t.List[t.Tuple[float, str, t.Any]]] = [] if record_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.query_time += elapsed
+            if self.sql is not None:
+                self.sql.append((elapsed, sql, params))
+
+
+def new_stats() -> RequestStats:
+    # only hold on to the SQL when something might log it
+    return RequestStats(record_sql=settings.SLOW_REQUEST_SECONDS is not None)
+
+
+@contextmanager
+def track(stats: RequestStats) -> t.Iterator[RequestStats]:
+    """
+    Count the queries made by this thread, and let TimedSerializer find `stats`.
+    """
+    previous = getattr(_local, "stats", None)
+    _local.stats = stats
+    try:
+        with connection.execute_wrapper(stats):
+            yield stats
+    finally:
+        _local.stats = previous
+
+
+class TimedSerializer(serializers.Serializer):
+    """
+    Counts the time taken building its representation as serialization in the current request,
+    if any. Only for serializers that aren't nested in another TimedSerializer.
+    """
+
+    def to_representation(self, instance):
+        stats = getattr(_local, "stats", None)
+        if stats is None:
+            return super().to_representation(instance)
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serialization_time += time.perf_counter() - start
+
+
+def record(view: str, status: int, elapsed: float, stats: RequestStats):
+    requests.inc(view, status)
+    request_time.observe(view, elapsed)
+    query_count.observe(view, stats.queries)
+    query_time.observe(view, stats.query_time)
+    serialization_time.observe(view, stats.serialization_time)
+    if settings.SLOW_REQUEST_SECONDS is not None and elapsed >= settings.SLOW_REQUEST_SECONDS:
+        log.warning(
+            "Slow request: %s %s in %.1fms, %d queries in %.1fms, serialization %.1fms%s",
+            view,
+            status,
+            elapsed * 1000,
+            stats.queries,
+            stats.query_time * 1000,
+            stats.serialization_time * 1000,
+            "".join(
+                f"\n  {seconds * 1000:.1f}ms {sql} {params!r}" for seconds, sql, params in stats.sql
+            ),
+        )
+
+
+def render_metrics() -> str:
+    metrics = [requests, request_time, query_count, query_time, serialization_time]
+    return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+class MetricsMiddleware(object):
+    """
+    Records the wall time, queries and serialization time of each request by view name.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with track(new_stats()) as stats:
+            response = self.get_response(request)
+        match = request.resolver_match
+        # the admin has too many views to be worth tracking
+        if match is not None and not match.namespace:
+            record(match.func.__name__, response.status_code, time.perf_counter() - start, stats)
+        return response
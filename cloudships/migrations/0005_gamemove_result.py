@@ -0,0 +1,72 @@
+# Generated by Django 3.0.4 on 2026-10-18 01:16
+
+from django.db import migrations, models
+
+RESULT_CHOICES = [("HIT", "HIT"), ("MISS", "MISS"), ("SUNK", "SUNK")]
+
+
+def get_squares(start_x, start_y, length, orientation):
+    if orientation == "vertical":
+        return {(start_x, start_y + xlate) for xlate in range(length)}
+    return {(start_x + xlate, start_y) for xlate in range(length)}
+
+
+def backfill_results(apps, schema_editor):
+    """
+    Replay every player's moves against their opponent's ships to record the result
+    and turn of each move.
+    """
+    GamePlayer = apps.get_model("cloudships", "GamePlayer")
+    GameSetup = apps.get_model("cloudships", "GameSetup")
+    GameMove = apps.get_model("cloudships", "GameMove")
+
+    for player in GamePlayer.objects.filter(moves__isnull=False).distinct().iterator():
+        shiplog = {}
+        enemy_ships = GameSetup.objects.filter(player__game=player.game_id).exclude(player=player)
+        for ship in enemy_ships:
+            squares = get_squares(ship.x, ship.y, ship.length, ship.orientation)
+            for square in squares:
+                shiplog[square] = squares
+
+        moves = list(GameMove.objects.filter(player=player).order_by("id"))
+        turn = 0
+        for move in moves:
+            move.turn = turn
+            squares = shiplog.get((move.x, move.y))
+            if squares is None:
+                move.result = "MISS"
+                turn += 1
+                continue
+            squares.discard((move.x, move.y))
+            move.result = "HIT" if squares else "SUNK"
+        GameMove.objects.bulk_update(moves, ["result", "turn"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cloudships", "0004_game_created_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gamemove",
+            name="result",
+            field=models.CharField(choices=RESULT_CHOICES, max_length=4, null=True),
+        ),
+        migrations.AddField(
+            model_name="gamemove", name="turn", field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_results, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="gamemove",
+            name="result",
+            field=models.CharField(choices=RESULT_CHOICES, max_length=4),
+        ),
+        migrations.AddIndex(
+            model_name="gamemove",
+            index=models.Index(
+                fields=["player", "turn", "id"], name="cloudships__player__5d2989_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.0.4 on 2026-10-18 01:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cloudships", "0005_gamemove_result"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="is_draw",
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="loser",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="cloudships.GamePlayer",
+            ),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="winner",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="cloudships.GamePlayer",
+            ),
+        ),
+        migrations.AddField(
+            model_name="gameplayer",
+            name="move_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="gameplayer",
+            name="shot_count",
+            field=models.IntegerField(default=0),
+        ),
+    ]
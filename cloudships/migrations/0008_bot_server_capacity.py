@@ -0,0 +1,73 @@
+# Generated by Django 3.0.4 on 2026-10-18 01:24
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cloudships", "0007_dispatch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="botserver",
+            name="max_concurrent_games",
+            field=models.IntegerField(
+                default=1,
+                help_text="Games this server can play at once",
+                validators=[django.core.validators.MinValueValidator(1)],
+            ),
+        ),
+        migrations.AddField(
+            model_name="dispatch",
+            name="finished_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dispatch",
+            name="server_1",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="cloudships.BotServer",
+            ),
+        ),
+        migrations.AddField(
+            model_name="dispatch",
+            name="server_2",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="cloudships.BotServer",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="dispatch",
+            name="state",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("sending", "Sending"),
+                    ("sent", "Sent"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=16,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dispatch",
+            index=models.Index(
+                condition=models.Q(("finished_at__isnull", True), ("state", "sent")),
+                fields=["sent_at"],
+                name="cloudships_dispatch_playing",
+            ),
+        ),
+    ]
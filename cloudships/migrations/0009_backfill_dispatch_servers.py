@@ -0,0 +1,36 @@
+# Generated by Django 3.0.4 on 2026-10-18 01:24
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def backfill_servers(apps, schema_editor):
+    """
+    Record which bot servers existing dispatches play on, and release the ones whose
+    games are already over.
+    """
+    Dispatch = apps.get_model("cloudships", "Dispatch")
+    Game = apps.get_model("cloudships", "Game")
+
+    games = Game.objects.filter(pk=OuterRef("game_id"))
+    Dispatch.objects.update(
+        server_1=Subquery(games.values("config__player_1")[:1]),
+        server_2=Subquery(games.values("config__player_2")[:1]),
+    )
+    Dispatch.objects.filter(game__state="finished").update(finished_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+    """
+    Kept apart from 0008: Postgres won't build 0008's indexes on the dispatch table in the same
+    transaction as writes to its new foreign keys.
+    """
+
+    dependencies = [
+        ("cloudships", "0008_bot_server_capacity"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_servers, migrations.RunPython.noop),
+    ]
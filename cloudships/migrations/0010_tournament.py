@@ -0,0 +1,81 @@
+# Generated by Django 3.0.4 on 2026-10-18 01:26
+
+import django.contrib.postgres.fields.jsonb
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cloudships", "0009_backfill_dispatch_servers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tournament",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("formats", django.contrib.postgres.fields.jsonb.JSONField()),
+                ("games_per_pairing", models.IntegerField(default=1)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "servers",
+                    models.ManyToManyField(related_name="tournaments", to="cloudships.BotServer"),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="gameconfig",
+            name="tournament",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="game_configs",
+                to="cloudships.Tournament",
+            ),
+        ),
+        migrations.CreateModel(
+            name="TournamentStanding",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("played", models.IntegerField(default=0)),
+                ("wins", models.IntegerField(default=0)),
+                ("draws", models.IntegerField(default=0)),
+                ("losses", models.IntegerField(default=0)),
+                ("points", models.IntegerField(default=0)),
+                (
+                    "server",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="cloudships.BotServer",
+                    ),
+                ),
+                (
+                    "tournament",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="standings",
+                        to="cloudships.Tournament",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("tournament", "server")},
+            },
+        ),
+    ]
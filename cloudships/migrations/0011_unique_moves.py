@@ -0,0 +1,60 @@
+# Generated by Django 3.0.4 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+def delete_duplicate_moves(apps, schema_editor):
+    """
+    Concurrent attacks could save the same move twice, keep the first of each.
+    """
+    GameMove = apps.get_model("cloudships", "GameMove")
+    duplicates = GameMove.objects.filter(
+        models.Exists(
+            GameMove.objects.filter(
+                player=models.OuterRef("player"),
+                x=models.OuterRef("x"),
+                y=models.OuterRef("y"),
+                id__lt=models.OuterRef("id"),
+            )
+        )
+    )
+    duplicates.delete()
+
+
+def detach_self_play(apps, schema_editor):
+    """
+    Games where a bot played itself have the same user in both seats. Keep the games but
+    detach the second seat from the user, as if the user had been deleted.
+    """
+    GamePlayer = apps.get_model("cloudships", "GamePlayer")
+    GamePlayer.objects.filter(
+        models.Exists(
+            GamePlayer.objects.filter(
+                game=models.OuterRef("game"),
+                player=models.OuterRef("player"),
+                id__lt=models.OuterRef("id"),
+            )
+        )
+    ).update(player=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cloudships", "0010_tournament"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_moves, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="gamemove",
+            constraint=models.UniqueConstraint(fields=("player", "x", "y"), name="unique_move"),
+        ),
+        migrations.RunPython(detach_self_play, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="gameplayer",
+            constraint=models.UniqueConstraint(
+                fields=("game", "player"), name="unique_game_player"
+            ),
+        ),
+    ]
@@ -1,21 +1,40 @@
 import itertools
+import random
 import typing as t
 import uuid
-from dataclasses import asdict, dataclass
+from collections import Counter, OrderedDict, deque
+from dataclasses import asdict, dataclass, field, replace
+from datetime import timedelta
 from enum import Enum
 from functools import cached_property
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import JSONField
-from django.db import models, transaction
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import connection, models, transaction
+from django.db.models import Q
+from django.utils import timezone
 
-from . import dispatcher
+from . import bitboard, dispatcher, notify
+from .cache import LRUCache, game_cache
 
 
 class GameException(Exception):
     pass
 
 
+class PlacementException(GameException):
+    """
+    Everything wrong with a ship placement, rather than just the first problem.
+    """
+
+    def __init__(self, errors: t.List[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
 class GameStates(models.TextChoices):
     JOIN_PHASE = "join"
     SETUP_PHASE = "setup"
@@ -40,6 +59,13 @@ class PlayerStates(models.TextChoices):
     DNF = "dnf"
 
 
+class DispatchStates(models.TextChoices):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
 @dataclass
 class ShipConfig(object):
     length: int
@@ -60,16 +86,153 @@ class Move(object):
     result: AttackEnum
 
 
+@dataclass
+class BoardIndex(object):
+    """
+    An attacker's view of their opponent's board, so a shot can be classified without
+    replaying the game. Built once per player, then copied and updated as moves are made.
+    """
+
+    board_size: int
+    # opponent cell (bitboard index) -> id of the ship occupying it
+    cells: t.Dict[int, int] = field(default_factory=dict)
+    # ship id -> bitboard of the cells it occupies
+    ships: t.Dict[int, int] = field(default_factory=dict)
+    # bitboard of the cells that have already been attacked
+    attacked: int = 0
+    shot_count: int = 0
+    # a turn is a streak of moves ending in a miss, so this is also the number of misses
+    turn: int = 0
+
+    @classmethod
+    def from_ships(cls, board_size: int, ships: t.Iterable["GameSetup"]) -> "BoardIndex":
+        index = cls(board_size=board_size)
+        for ship in ships:
+            mask = ship.mask(board_size)
+            index.ships[ship.id] = mask
+            for i in bitboard.indexes(mask):
+                index.cells[i] = ship.id
+        return index
+
+    @classmethod
+    def load(cls, player: "GamePlayer") -> "BoardIndex":
+        index = cls.from_ships(
+            player.game.config.board_size,
+            GameSetup.objects.exclude(player=player).filter(player__game=player.game_id),
+        )
+        for x, y in GameMove.objects.filter(player=player).order_by("id").values_list("x", "y"):
+            index.attack(x, y)
+        return index
+
+    def copy(self) -> "BoardIndex":
+        # attacking only changes attacked, shot_count and turn, so the ships can be shared
+        return replace(self)
+
+    def is_attacked(self, x: int, y: int) -> bool:
+        return bool(self.attacked >> bitboard.index(x, y, self.board_size) & 1)
+
+    def attack(self, x: int, y: int) -> AttackEnum:
+        i = bitboard.index(x, y, self.board_size)
+        if self.attacked >> i & 1:
+            raise GameException("Move has already been made")
+        self.attacked |= 1 << i
+        self.shot_count += 1
+        ship_id = self.cells.get(i)
+        if ship_id is None:
+            self.turn += 1
+            return AttackEnum.MISS
+        if self.ships[ship_id] & ~self.attacked:
+            return AttackEnum.HIT
+        return AttackEnum.SUNK
+
+
+class BoardIndexCache(object):
+    """
+    BoardIndex objects keyed by the attacking GamePlayer's pk, in `backend` (see game_cache).
+
+    Moves are always saved to the database first (GameMove.objects.create_if_current only saves
+    a move classified by a current index), and changed indexes are `set` afterwards. An index
+    that has missed any moves is rebuilt, so a cache shared between processes stays consistent.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, player_id: int) -> t.Optional[BoardIndex]:
+        return self.backend.get(player_id)
+
+    def set(self, player_id: int, index: BoardIndex):
+        self.backend.set(player_id, index)
+
+    def discard(self, player_id: int):
+        self.backend.discard(player_id)
+
+    def clear(self):
+        self.backend.clear()
+
+    def load(self, player: "GamePlayer", shot_count: int) -> BoardIndex:
+        """
+        The player's index, rebuilt if it's missing (new process) or hasn't seen all
+        `shot_count` of their shots (moves made through another process).
+        """
+        index = self.get(player.pk)
+        if index is None or index.shot_count != shot_count:
+            index = BoardIndex.load(player)
+            self.set(player.pk, index)
+        return index
+
+
+board_indexes = BoardIndexCache(game_cache("board_index", max_size=2048))
+# (game id, user id) -> serialized game state, while the game is in the attack phase and its
+# state can't change until GameManager.finish_game, which replaces it with False. Only kept in
+# a cache shared between processes, since finish_game can't reach the other processes' caches.
+attack_statuses = game_cache("attack_status", max_size=4096) if settings.GAME_CACHE else None
+
+
+@dataclass(frozen=True)
+class Attacker(object):
+    """
+    The GamePlayer behind a user's attacks on a game. It never changes, so repeat attacks can
+    skip looking it up.
+    """
+
+    player_id: int
+    board_size: int
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.board_size and 0 <= y < self.board_size
+
+
+# (game id, user id) -> Attacker
+attackers: LRUCache[t.Tuple[uuid.UUID, int], Attacker] = LRUCache(max_size=4096)
+
+
 class BotServer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     server_address = models.CharField(max_length=100)
+    max_concurrent_games = models.IntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text="Games this server can play at once",
+    )
 
     def __str__(self):
         return self.user.username
 
 
 class GameConfigManager(models.Manager):
+    def with_summary(self):
+        return self.select_related("player_1__user", "player_2__user").annotate(
+            num_games=models.Count("game")
+        )
+
     def create_config(self, board_size: int, ship_configs: t.Sequence[ShipConfig]):
+        self.check_config(board_size, ship_configs)
+        return GameConfig.objects.create(
+            board_size=board_size, ship_config=[cfg.asdict() for cfg in ship_configs],
+        )
+
+    def check_config(self, board_size: int, ship_configs: t.Sequence[ShipConfig]):
         if not board_size > 0:
             raise GameException("Board size must be > 0")
         # todo: find a better packing algorithm
@@ -78,9 +241,6 @@ class GameConfigManager(models.Manager):
             raise GameException("Must have at least 1 ship")
         if consumed_squares > board_size * board_size:
             raise GameException(f"Not enough empty tiles {consumed_squares}")
-        return GameConfig.objects.create(
-            board_size=board_size, ship_config=[cfg.asdict() for cfg in ship_configs],
-        )
 
 
 class GameConfig(models.Model):
@@ -93,6 +253,9 @@ class GameConfig(models.Model):
         "BotServer", on_delete=models.SET_NULL, null=True, related_name="+"
     )
     count = models.IntegerField(default=10)
+    tournament = models.ForeignKey(
+        "Tournament", on_delete=models.CASCADE, null=True, blank=True, related_name="game_configs"
+    )
     objects = GameConfigManager()
 
     @property
@@ -102,26 +265,95 @@ class GameConfig(models.Model):
     def __str__(self):
         return f"({self.pk}) {self.player_1} vs {self.player_2}"
 
+    def clean(self):
+        try:
+            self.check_players()
+        except GameException as e:
+            raise ValidationError(str(e))
+
+    def check_players(self):
+        if self.player_1_id is not None and self.player_1_id == self.player_2_id:
+            raise GameException("A bot server can't play against itself")
+
+    def build_games(self, count: int) -> t.List["Game"]:
+        """
+        Create `count` games between player_1 and player_2 without dispatching them.
+        """
+        return Game.objects.build_games([(self, count)])
+
+    def check_placement(self, ships: t.Sequence[ShipDict]):
+        """
+        Check ships fit on the board without overlapping or touching, in the numbers and lengths
+        of ship_config. Raises PlacementException with every violation found.
+        """
+        errors = []
+        occupied = 0
+        lengths = Counter()
+        for i, ship in enumerate(ships):
+            x, y, length, orientation = ship["x"], ship["y"], ship["length"], ship["orientation"]
+            lengths[length] += 1
+            if not bitboard.fits(x, y, length, orientation, self.board_size):
+                errors.append(f"Ship[{i}] is out of bounds")
+                continue
+            mask = bitboard.ship(x, y, length, orientation, self.board_size)
+            if occupied & mask:
+                errors.append(f"Ship[{i}] is overlapping another ship")
+            # ships can't touch, so block out the ship and everything around it
+            occupied |= bitboard.dilate(mask, self.board_size)
+
+        expected = Counter({cfg.length: cfg.count for cfg in self.ships})
+        for length in sorted(expected.keys() | lengths.keys()):
+            if lengths[length] != expected[length]:
+                errors.append(
+                    f"Invalid ship configuration: expected {expected[length]} ships of length "
+                    f"{length}, got {lengths[length]}"
+                )
+        if errors:
+            raise PlacementException(errors)
+
     def create_game(self, callback_url):
-        game = Game.objects.create(state=GameStates.SETUP_PHASE, config=self)
-        GamePlayer.objects.bulk_create(
-            [
-                GamePlayer(game=game, player=self.player_1.user),
-                GamePlayer(game=game, player=self.player_2.user),
-            ]
-        )
-        dispatcher.dispatch(callback_url, game, self.player_1, self.player_2)
+        (game,) = self.build_games(1)
+        Dispatch.objects.enqueue(callback_url, [game])
         return game
 
-    def create_all_games(self, callback_url):
-        for _ in range(self.count):
-            self.create_game(callback_url)
+    def create_all_games(self, callback_url) -> t.List["Game"]:
+        """
+        Create `count` games and queue them for the dispatch worker.
+        """
+        games = self.build_games(self.count)
+        Dispatch.objects.enqueue(callback_url, games)
+        return games
 
     def game_count(self):
         return self.game_set.all().count()
 
 
 class GameManager(models.Manager):
+    def build_games(self, configs: t.Sequence[t.Tuple[GameConfig, int]]) -> t.List["Game"]:
+        """
+        Create `count` games for each config without dispatching them, in two queries
+        however many configs there are.
+        """
+        for config, _count in configs:
+            config.check_players()
+        games = self.bulk_create(
+            [
+                Game(state=GameStates.SETUP_PHASE, config=config)
+                for config, count in configs
+                for _ in range(count)
+            ]
+        )
+        GamePlayer.objects.bulk_create(
+            itertools.chain.from_iterable(
+                (
+                    GamePlayer(game=game, player=game.config.player_1.user),
+                    GamePlayer(game=game, player=game.config.player_2.user),
+                )
+                for game in games
+            )
+        )
+        return games
+
     @transaction.atomic
     def finish_game(self, game_id, players):
         game = Game.objects.filter(id=game_id).select_for_update().first()
@@ -131,6 +363,7 @@ class GameManager(models.Manager):
         # check to see if players have placed their ships
         # - don't disqualify a timed out player if the opponent didn't place!
         players = list(game.players.all())
+        already_finished = game.state == GameStates.FINISHED
         if game.state == GameStates.SETUP_PHASE:
             for player in players:
                 if GameSetup.objects.filter(player=player).exists():
@@ -139,11 +372,26 @@ class GameManager(models.Manager):
                     player.state = PlayerStates.DNF
         elif game.state == GameStates.ATTACK_PHASE:
             for player in players:
-                player.state = player_map[player.player.username]
-                player.save()
+                player.state = player_map[player.username]
 
         game.state = GameStates.FINISHED
+        game.compute_result(players)
         game.save()
+        notify.notify_state(game.pk, game.state)
+        GamePlayer.objects.bulk_update(players, ["state", "move_count", "shot_count"])
+        for player in players:
+            board_indexes.discard(player.pk)
+            attackers.discard((game.pk, player.player_id))
+            if attack_statuses is not None:
+                # rather than deleting it, so a request that read the attack phase before this
+                # commits can't cache it again (see views.game_state)
+                attack_statuses.set((game.pk, player.player_id), False)
+        # frees the bot server slots held by this game, see DispatchQuerySet.claim
+        Dispatch.objects.filter(game=game, finished_at__isnull=True).update(
+            finished_at=timezone.now()
+        )
+        if not already_finished:
+            TournamentStanding.objects.record(game, players)
 
 
 class Game(models.Model):
@@ -152,6 +400,14 @@ class Game(models.Model):
     state = models.CharField(max_length=20, choices=States.choices)
     config = models.ForeignKey(GameConfig, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    # the outcome is stored when the game finishes, see compute_result
+    loser = models.ForeignKey(
+        "GamePlayer", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    winner = models.ForeignKey(
+        "GamePlayer", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    is_draw = models.BooleanField(null=True, blank=True)
     objects = GameManager()
 
     def __str__(self):
@@ -162,62 +418,41 @@ class Game(models.Model):
         """
         Returns a list of moves (in order) for a game.
         """
-        players = list(
-            self.players.prefetch_related(
-                models.Prefetch(
-                    "moves", to_attr="prefetched_moves", queryset=GameMove.objects.order_by("id"),
-                ),
-                models.Prefetch("ships", to_attr="prefetched_ships"),
-            )
+        # each player's streak of moves for a turn is grouped together.
+        # player 1 always goes first, but there's no advantage.
+        moves = (
+            GameMove.objects.filter(player__game=self)
+            .select_related("player__player")
+            .order_by("turn", "player_id", "id")
         )
-        if len(players) != 2:
-            raise GameException("Player count is not 2")
-        p1, p2 = players
-        stream: t.List[Move] = []
-
-        # for easy access to find out if a ship is sunk
-        p1_shiplog = {}
-        p2_shiplog = {}
-        for ship in p1.prefetched_ships:
-            s = ship.occupied_squares
-            for x, y in s:
-                p1_shiplog[(x, y)] = s
-
-        for ship in p2.prefetched_ships:
-            s = ship.occupied_squares
-            for x, y in s:
-                p2_shiplog[(x, y)] = s
-
-        def move_gen(player, enemy_log):
-            # generate streaks of moves for a player
-            # a player gets another turn if there's a hit.
-            streak = []
-            for move in player.prefetched_moves:
-                p = (move.x, move.y)
-                if p not in enemy_log:
-                    streak.append(Move(x=p[0], y=p[1], player=player, result=AttackEnum.MISS))
-                    yield streak
-                    streak = []
-                else:
-                    squares = enemy_log[p]
-                    squares.remove(p)
-                    if len(squares) == 0:
-                        streak.append(Move(x=p[0], y=p[1], player=player, result=AttackEnum.SUNK))
-                    else:
-                        streak.append(Move(x=p[0], y=p[1], player=player, result=AttackEnum.HIT))
-            yield streak
-
-        for m1, m2 in itertools.zip_longest(
-            move_gen(p1, p2_shiplog), move_gen(p2, p1_shiplog), fillvalue=[]
-        ):
-            # player 1 always goes first, but there's no advantage.
-            stream.extend(m1)
-            stream.extend(m2)
-        return stream
+        return [
+            Move(x=move.x, y=move.y, player=move.player, result=AttackEnum(move.result))
+            for move in moves
+        ]
 
-    @cached_property
-    def loser(self) -> t.Optional["GamePlayer"]:
-        players = list(self.players.all())
+    def compute_result(self, players: t.Sequence["GamePlayer"]):
+        """
+        Work out the outcome of a finished game and set it on the game and its players.
+        The caller is responsible for saving them.
+        """
+        counts = {
+            row["player_id"]: row
+            for row in GameMove.objects.filter(player__game=self)
+            .values("player_id")
+            .annotate(shots=models.Count("id"), turns=models.Max("turn") + 1)
+        }
+        for player in players:
+            row = counts.get(player.id, {})
+            player.shot_count = row.get("shots", 0)
+            player.move_count = row.get("turns", 0)
+
+        self.loser = self._find_loser(players)
+        self.winner = None
+        if self.loser is not None:
+            self.winner = next((player for player in players if player != self.loser), None)
+        self.is_draw = self.loser is None
+
+    def _find_loser(self, players: t.Sequence["GamePlayer"]) -> t.Optional["GamePlayer"]:
         dnf = None
         for player in players:
             if player.state == PlayerStates.DNF:
@@ -226,30 +461,28 @@ class Game(models.Model):
                 dnf = player
         if dnf is not None:
             return dnf
-        moves = self.move_stream
         # determine a loser by last 2 being same player
         # determine a draw by last 2 being different players
+        last_moves = (
+            GameMove.objects.filter(player__game=self)
+            .order_by("-turn", "-player_id", "-id")
+            .values_list("player_id", flat=True)
+        )
         try:
-            l, ll = moves[-2:]
+            l, ll = last_moves[:2]
         except ValueError:
             # less than 2 moves in the game???
             return None
-        if l.player == ll.player:
-            return l.player
+        if l == ll:
+            return next(player for player in players if player.id == l)
         return None
 
-    @cached_property
-    def winner(self) -> t.Optional["GamePlayer"]:
-        loser = self.loser
-        if loser is None:
-            return None
-        return self.players.exclude(id=loser.id).get()
-
     def scores(self):
-        return " vs ".join(
-            str(p.moves.count())
-            for p in self.players.all()
-        )
+        players = self.players.order_by("id")
+        if self.state == GameStates.FINISHED:
+            return " vs ".join(str(p.shot_count) for p in players)
+        # shot_count is only stored when the game finishes
+        return " vs ".join(str(p.shots) for p in players.annotate(shots=models.Count("moves")))
 
 
 class GamePlayerQuerySet(models.QuerySet):
@@ -267,6 +500,7 @@ class GamePlayerQuerySet(models.QuerySet):
         game_player = (
             self.find_game(game_id, player)
             .in_phase(GameStates.SETUP_PHASE)
+            .select_related("game__config")
             .prefetch_related(models.Prefetch("ships", to_attr="prefetched_ships"))
         ).first()
         if not game_player:
@@ -275,86 +509,139 @@ class GamePlayerQuerySet(models.QuerySet):
             raise GameException("Game is not in setup phase")
         if len(game_player.prefetched_ships) > 0:
             raise GameException("Already placed ships")
+        # validate before taking the lock, which then only covers the insert
+        game_player.game.config.check_placement(ships)
 
         with transaction.atomic():
-            game_player = (
+            locked = (
                 GamePlayer.objects.filter(pk=game_player.pk)
-                .select_related("game", "game__config")
-                .select_for_update(skip_locked=True, of=("self",))
-                .first()
+                .select_for_update(skip_locked=True)
+                .exists()
             )
-            if game_player is None:
+            if not locked:
                 raise GameException("Race condition")
-
-            # validate ship config.
-            occupied_squares: t.Set[t.Tuple[int, int]] = set()
-            required_ships = {
-                cfg.length: dict(expected=cfg.count, count=0)
-                for cfg in game_player.game.config.ships
-            }
-            ship_objs = [GameSetup(player=game_player, **ship) for ship in ships]
-            for i, ship in enumerate(ship_objs):
-                required_ships[ship.length]["count"] += 1
-                squares = ship.occupied_squares
-                # 'cause it's a square we can do cool square arithmetic
-                all_points = set(itertools.chain.from_iterable(point for point in squares))
-                if min(all_points) < 0 or max(all_points) >= game_player.game.config.board_size:
-                    raise GameException(f"Ship[{i}] is out of bounds")
-                if occupied_squares.intersection(squares):
-                    raise GameException(f"Ship[{i}] is overlapping another ship")
-                occupied_squares.update(squares.union(ship.surrounding_squares))
-
-            for value in required_ships.values():
-                if value["count"] != value["expected"]:
-                    raise GameException(f"Invalid ship configuration")
-
-            GameSetup.objects.bulk_create(ship_objs)
+            # another request may have placed them since we looked
+            if GameSetup.objects.filter(player=game_player).exists():
+                raise GameException("Already placed ships")
+            GameSetup.objects.bulk_create([GameSetup(player=game_player, **ship) for ship in ships])
 
         # if both players have set up, progress to the next stage
-        Game.objects.filter(pk=game_player.game.pk).annotate(
-            count=models.Count("players__ships__player_id", distinct=True)
-        ).filter(count=2).update(state=GameStates.ATTACK_PHASE)
+        started = (
+            Game.objects.filter(pk=game_player.game.pk)
+            .annotate(count=models.Count("players__ships__player_id", distinct=True))
+            .filter(count=2)
+            .update(state=GameStates.ATTACK_PHASE)
+        )
+        if started:
+            notify.notify_state(game_player.game.pk, GameStates.ATTACK_PHASE)
+            # build the attack indexes up front so the first attacks don't pay for it
+            for player in GamePlayer.objects.filter(game=game_player.game).select_related(
+                "game__config"
+            ):
+                board_indexes.set(player.pk, BoardIndex.load(player))
+
+    def lock_attacker(self, player_id: int):
+        """
+        Lock the player for the rest of the transaction so their moves are classified and saved
+        one at a time. Only the player's row, so their opponent can attack at the same time.
+        """
+        self.filter(pk=player_id).select_for_update().exists()
 
-    def make_move(self, game_id: uuid.UUID, player: User, x: int, y: int) -> AttackEnum:
+    def attacker(self, game_id: uuid.UUID, player: User) -> "GamePlayer":
         game_player = (
             self.find_game(game_id, player)
             .in_phase(Game.States.ATTACK_PHASE)
-            .annotate(
-                in_bounds=models.ExpressionWrapper(
-                    models.Q(game__config__board_size__gt=x)
-                    & models.Q(game__config__board_size__gt=y),
-                    output_field=models.BooleanField(),
-                )
-            )
-            .prefetch_related(models.Prefetch("moves", to_attr="prefetched_moves"))
-        )
-        game_player = game_player.first()
+            .select_related("game__config")
+        ).first()
         if not game_player:
             raise GameException("Cannot find game")
         if not game_player.correct_phase:
             raise GameException("Game is not in attack phase")
-        if x < 0 or y < 0 or not game_player.in_bounds:
+        return game_player
+
+    def make_move(self, game_id: uuid.UUID, player: User, x: int, y: int) -> AttackEnum:
+        attacker = attackers.get((game_id, player.pk))
+        if attacker is not None and attacker.in_bounds(x, y):
+            with transaction.atomic():
+                self.lock_attacker(attacker.player_id)
+                index = board_indexes.get(attacker.player_id)
+                if index is not None and not index.is_attacked(x, y):
+                    # The cached index is only replaced once the move is saved, which only
+                    # happens if the index had seen all of the player's moves.
+                    index = index.copy()
+                    shot_count, turn = index.shot_count, index.turn
+                    result = index.attack(x, y)
+                    if GameMove.objects.create_if_current(
+                        attacker.player_id, shot_count, x=x, y=y, result=result, turn=turn
+                    ):
+                        board_indexes.set(attacker.player_id, index)
+                        return result
+                    board_indexes.discard(attacker.player_id)
+        # otherwise look everything up again, which also reports why the move can't be made
+        game_player = self.attacker(game_id, player)
+        if not game_player.in_bounds(x, y):
             raise GameException("Attack is out of bounds")
 
-        # find out if they've moved previously
-        previous_moves = {(move.x, move.y) for move in game_player.prefetched_moves}
-        if (x, y) in previous_moves:
-            raise GameException("Move has already been made")
-        # find out if there was a hit.
-        enemy_ships = GameSetup.objects.exclude(player=game_player).filter(
-            player__game=game_player.game
-        )
-        result = AttackEnum.MISS
-        for ship in enemy_ships:
-            squares = ship.occupied_squares
-            if (x, y) in squares:
-                result = AttackEnum.HIT
-                if previous_moves.union({(x, y)}).issuperset(squares):
-                    result = AttackEnum.SUNK
-                break
-        game_player.moves.add(GameMove.objects.create(player=game_player, x=x, y=y))
+        with transaction.atomic():
+            index = self.locked_index(game_player)
+            shot_count, turn = index.shot_count, index.turn
+            result = index.attack(x, y)
+            if not GameMove.objects.create_if_current(
+                game_player.pk, shot_count, x=x, y=y, result=result, turn=turn
+            ):
+                # the index is current, so the game must have finished since we looked
+                raise GameException("Game is not in attack phase")
+            board_indexes.set(game_player.pk, index)
+        attackers.set((game_id, player.pk), Attacker(game_player.pk, index.board_size))
         return result
 
+    def locked_index(self, game_player: "GamePlayer") -> BoardIndex:
+        """
+        Lock the player (see lock_attacker) and return a copy of their index, current as of
+        the lock, to classify new moves with.
+        """
+        self.lock_attacker(game_player.pk)
+        shot_count = (
+            self.filter(pk=game_player.pk, game__state=Game.States.ATTACK_PHASE)
+            .annotate(shots_taken=models.Count("moves"))
+            .values_list("shots_taken", flat=True)
+            .first()
+        )
+        if shot_count is None:
+            raise GameException("Game is not in attack phase")
+        return board_indexes.load(game_player, shot_count).copy()
+
+    def make_moves(
+        self, game_id: uuid.UUID, player: User, shots: t.Sequence[t.Tuple[int, int]]
+    ) -> t.List[AttackEnum]:
+        """
+        Make a streak of attacks in order, stopping at the first miss since that ends the
+        turn. Returns the result of each attack made. Every attack is checked first, including
+        those after a miss, and if any is invalid none are saved.
+        """
+        game_player = self.attacker(game_id, player)
+        for i, (x, y) in enumerate(shots):
+            if not game_player.in_bounds(x, y):
+                raise GameException(f"Attack[{i}] is out of bounds")
+
+        with transaction.atomic():
+            index = self.locked_index(game_player)
+            seen = set()
+            for i, (x, y) in enumerate(shots):
+                if index.is_attacked(x, y) or (x, y) in seen:
+                    raise GameException(f"Attack[{i}] has already been made")
+                seen.add((x, y))
+            moves = []
+            for x, y in shots:
+                turn = index.turn
+                result = index.attack(x, y)
+                moves.append(GameMove(player=game_player, x=x, y=y, result=result, turn=turn))
+                if result == AttackEnum.MISS:
+                    break
+            GameMove.objects.bulk_create(moves)
+            board_indexes.set(game_player.pk, index)
+        return [move.result for move in moves]
+
 
 class GamePlayer(models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name="players")
@@ -362,10 +649,28 @@ class GamePlayer(models.Model):
     state = models.CharField(
         choices=PlayerStates.choices, max_length=16, default=PlayerStates.PLAYING
     )
+    # turns taken and total attacks made, stored when the game finishes
+    move_count = models.IntegerField(default=0)
+    shot_count = models.IntegerField(default=0)
     objects = GamePlayerQuerySet.as_manager()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["game", "player"], name="unique_game_player")
+        ]
+
     def __str__(self):
-        return self.player.username
+        return self.username or f"Deleted user ({self.pk})"
+
+    @property
+    def username(self) -> t.Optional[str]:
+        # None once the user is deleted, or for the second seat of a self-play game from before
+        # migration 0011
+        return self.player.username if self.player is not None else None
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        board_size = self.game.config.board_size
+        return 0 <= x < board_size and 0 <= y < board_size
 
 
 class GameSetupQuerySet(models.QuerySet):
@@ -382,35 +687,361 @@ class GameSetup(models.Model):
     orientation = models.TextField(max_length=15, choices=Orientation.choices)
     objects = GameSetupQuerySet.as_manager()
 
-    @classmethod
-    def get_squares(cls, start_x, start_y, length, orientation):
-        if orientation == Orientation.VERTICAL:
-            return {(start_x, start_y + xlate) for xlate in range(length)}
-        return {(start_x + xlate, start_y) for xlate in range(length)}
+    def mask(self, board_size: int) -> int:
+        return bitboard.ship(self.x, self.y, self.length, self.orientation, board_size)
 
-    @property
-    def occupied_squares(self) -> t.Set[t.Tuple[int, int]]:
-        return self.get_squares(self.x, self.y, self.length, self.orientation)
+    def halo(self, board_size: int) -> int:
+        return bitboard.halo(self.mask(board_size), board_size)
 
-    @property
-    def surrounding_squares(self) -> t.Set[t.Tuple[int, int]]:
-        if self.orientation == Orientation.VERTICAL:
-            return (
-                self.get_squares(self.x - 1, self.y - 1, self.length + 2, self.orientation)
-                .union(self.get_squares(self.x + 1, self.y - 1, self.length + 2, self.orientation))
-                .union({(self.x, self.y - 1), (self.x, self.y + self.length)})
+
+class GameMoveQuerySet(models.QuerySet):
+    def create_if_current(self, player_id: int, shot_count: int, **fields) -> bool:
+        """
+        Save a move only if the player's game is in the attack phase and they have made exactly
+        `shot_count` moves so far, i.e. the BoardIndex the move was classified with is current.
+        Only reliable while holding the player's lock (GamePlayerQuerySet.lock_attacker), since
+        under READ COMMITTED concurrent inserts can both see the same count. A move that's
+        already been made is left alone.
+        """
+        fields["player_id"] = player_id
+        columns = [GameMove._meta.get_field(name).column for name in fields]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {GameMove._meta.db_table} ({", ".join(columns)})
+                SELECT {", ".join(["%s"] * len(columns))}
+                WHERE EXISTS (
+                    SELECT 1 FROM {GamePlayer._meta.db_table} p
+                    JOIN {Game._meta.db_table} g ON g.id = p.game_id
+                    WHERE p.id = %s AND g.state = %s
+                ) AND (
+                    SELECT COUNT(*) FROM {GameMove._meta.db_table} WHERE player_id = %s
+                ) = %s
+                ON CONFLICT (player_id, x, y) DO NOTHING
+                """,
+                [*fields.values(), player_id, GameStates.ATTACK_PHASE, player_id, shot_count],
             )
-        return (
-            self.get_squares(self.x - 1, self.y - 1, self.length + 2, self.orientation)
-            .union(self.get_squares(self.x - 1, self.y + 1, self.length + 2, self.orientation))
-            .union({(self.x - 1, self.y), (self.x + self.length, self.y)})
-        )
+            return cursor.rowcount == 1
 
 
 class GameMove(models.Model):
     player = models.ForeignKey(GamePlayer, on_delete=models.CASCADE, related_name="moves")
     x = models.IntegerField()
     y = models.IntegerField()
+    result = models.CharField(max_length=4, choices=[(r.value, r.value) for r in AttackEnum])
+    # the number of misses the player had made before this move
+    turn = models.IntegerField(default=0)
+    objects = GameMoveQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["player", "turn", "id"])]
+        # also covers counting and deduplicating a player's moves
+        constraints = [models.UniqueConstraint(fields=["player", "x", "y"], name="unique_move")]
 
     def __str__(self):
         return f"({self.x}, {self.y}) for {self.player}"
+
+
+# arbitrary key for the advisory lock that serialises DispatchQuerySet.claim
+DISPATCH_LOCK_ID = 0x5D15
+
+
+class DispatchQuerySet(models.QuerySet):
+    def enqueue(self, callback_url, games: t.Sequence[Game]) -> t.List["Dispatch"]:
+        """
+        Queue games between their config's player_1 and player_2.
+        """
+        return self.bulk_create(
+            [
+                Dispatch(
+                    game=game,
+                    server_1=game.config.player_1,
+                    server_2=game.config.player_2,
+                    payload=dispatcher.build_payload(
+                        callback_url, game, game.config.player_1, game.config.player_2
+                    ),
+                )
+                for game in games
+            ]
+        )
+
+    def busy_slots(self, now, slot_timeout: float) -> t.Counter[int]:
+        """
+        Games each bot server is currently playing: dispatches being sent under a live lease,
+        and sent games that haven't finished yet. A game counts once on each of its servers, like
+        the dispatcher's slots. Sent games older than `slot_timeout` seconds are assumed lost so a
+        missing finish callback can't block a server forever.
+        """
+        active = self.filter(
+            Q(state=DispatchStates.SENDING, next_attempt_at__gt=now)
+            | Q(
+                state=DispatchStates.SENT,
+                finished_at__isnull=True,
+                sent_at__gt=now - timedelta(seconds=slot_timeout),
+            )
+        )
+        busy: t.Counter[int] = Counter()
+        for server_ids in active.values_list("server_1_id", "server_2_id"):
+            busy.update({server_id for server_id in server_ids if server_id is not None})
+        return busy
+
+    def claim(self, limit: int, lease: float, slot_timeout: float) -> t.List["Dispatch"]:
+        """
+        Take up to `limit` due dispatches whose bot servers have free slots (see
+        BotServer.max_concurrent_games). Pairings take turns so one large config can't starve
+        the others, and each pairing's games go out oldest first.
+
+        Claimed rows are marked as sending for `lease` seconds, and are picked up again if this
+        worker dies before recording the outcome.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            # only one scheduler at a time, or two workers could both fill a server's last slot
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [DISPATCH_LOCK_ID])
+            due = (
+                self.filter(
+                    state__in=[DispatchStates.PENDING, DispatchStates.SENDING],
+                    next_attempt_at__lte=now,
+                )
+                .order_by("next_attempt_at", "id")
+                .select_for_update(skip_locked=True)
+                .values_list("id", "server_1_id", "server_2_id")
+            )
+            queues: t.Dict[t.Tuple[int, int], t.Deque[int]] = OrderedDict()
+            for pk, server_1_id, server_2_id in due:
+                queues.setdefault((server_1_id, server_2_id), deque()).append(pk)
+            if not queues:
+                return []
+
+            server_ids = {server_id for pair in queues for server_id in pair}
+            free = {
+                pk: capacity
+                for pk, capacity in BotServer.objects.filter(pk__in=server_ids).values_list(
+                    "pk", "max_concurrent_games"
+                )
+            }
+            for server_id, games in self.busy_slots(now, slot_timeout).items():
+                if server_id in free:
+                    free[server_id] -= games
+
+            picked: t.List[int] = []
+            pending = deque(queues.items())
+            while pending and len(picked) < limit:
+                pair, pks = pending.popleft()
+                # one slot on each server, and a deleted server has no limit to respect
+                needed = {server_id for server_id in pair if server_id in free}
+                if any(free[server_id] < 1 for server_id in needed):
+                    # full until one of its games finishes, try again on the next claim
+                    continue
+                for server_id in needed:
+                    free[server_id] -= 1
+                picked.append(pks.popleft())
+                if pks:
+                    pending.append((pair, pks))
+
+            self.filter(pk__in=picked).update(
+                state=DispatchStates.SENDING, next_attempt_at=now + timedelta(seconds=lease)
+            )
+        return list(self.filter(pk__in=picked).order_by("id"))
+
+
+class Dispatch(models.Model):
+    """
+    Outbox of games waiting to be sent to the dispatcher, see the dispatch_worker command.
+    """
+
+    States = DispatchStates
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name="dispatches")
+    server_1 = models.ForeignKey(
+        BotServer, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    server_2 = models.ForeignKey(
+        BotServer, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    payload = JSONField()
+    state = models.CharField(max_length=16, choices=States.choices, default=States.PENDING)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # milliseconds taken by the successful request
+    latency = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # set by finish_game, a sent game holds a slot on both servers until then
+    finished_at = models.DateTimeField(null=True, blank=True)
+    objects = DispatchQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["state", "next_attempt_at"]),
+            models.Index(
+                fields=["sent_at"],
+                name="cloudships_dispatch_playing",
+                condition=Q(state=DispatchStates.SENT, finished_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.game_id} ({self.get_state_display()})"
+
+    def mark_sent(self, latency: float):
+        self.state = DispatchStates.SENT
+        self.attempts += 1
+        self.latency = latency
+        self.sent_at = timezone.now()
+        self.last_error = ""
+        self.save(update_fields=["state", "attempts", "latency", "sent_at", "last_error"])
+
+    def mark_failed(self, error: Exception, max_attempts: int, retry_delay: float):
+        self.attempts += 1
+        self.last_error = str(error)
+        if self.attempts >= max_attempts:
+            self.state = DispatchStates.FAILED
+        else:
+            self.state = DispatchStates.PENDING
+            # exponential backoff with some jitter so retries don't arrive in lockstep
+            delay = retry_delay * 2 ** (self.attempts - 1) * random.uniform(0.8, 1.2)
+            self.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        self.save(update_fields=["state", "attempts", "last_error", "next_attempt_at"])
+
+
+class TournamentManager(models.Manager):
+    @transaction.atomic
+    def create_tournament(
+        self,
+        name: str,
+        servers: t.Sequence[BotServer],
+        formats: t.Sequence[t.Tuple[int, t.Sequence[ShipConfig]]],
+        games_per_pairing: int = 1,
+    ) -> "Tournament":
+        tournament = Tournament(
+            name=name,
+            formats=[
+                dict(board_size=board_size, ship_config=[cfg.asdict() for cfg in ship_configs])
+                for board_size, ship_configs in formats
+            ],
+            games_per_pairing=games_per_pairing,
+        )
+        tournament.check_formats()
+        tournament.save()
+        tournament.servers.set(servers)
+        return tournament
+
+
+class Tournament(models.Model):
+    """
+    A round robin where every pair of servers plays `games_per_pairing` games on each format,
+    scored 2 points for a win and 1 for a draw.
+    """
+
+    name = models.CharField(max_length=100)
+    servers = models.ManyToManyField(BotServer, related_name="tournaments")
+    # [{"board_size": int, "ship_config": [{"length": int, "count": int}]}]
+    formats = JSONField()
+    games_per_pairing = models.IntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    started_at = models.DateTimeField(null=True, blank=True)
+    objects = TournamentManager()
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        try:
+            self.check_formats()
+        except (GameException, KeyError, TypeError) as e:
+            raise ValidationError({"formats": str(e)})
+
+    def check_formats(self):
+        if not self.formats:
+            raise GameException("A tournament needs at least 1 format")
+        for fmt in self.formats:
+            GameConfig.objects.check_config(
+                fmt["board_size"], [ShipConfig(**cfg) for cfg in fmt["ship_config"]]
+            )
+
+    @transaction.atomic
+    def start(self, callback_url) -> t.List[Game]:
+        """
+        Create every pairing's games and queue them for the dispatch worker, which keeps each
+        bot server within its max_concurrent_games.
+        """
+        if Tournament.objects.select_for_update().get(pk=self.pk).started_at is not None:
+            raise GameException("Tournament has already started")
+        servers = list(self.servers.select_related("user").order_by("pk"))
+        if len(servers) < 2:
+            raise GameException("A tournament needs at least 2 bot servers")
+        TournamentStanding.objects.bulk_create(
+            TournamentStanding(tournament=self, server=server) for server in servers
+        )
+        configs = GameConfig.objects.bulk_create(
+            GameConfig(
+                tournament=self,
+                board_size=fmt["board_size"],
+                ship_config=fmt["ship_config"],
+                player_1=server_1,
+                player_2=server_2,
+                count=self.games_per_pairing,
+            )
+            for server_1, server_2 in itertools.combinations(servers, 2)
+            for fmt in self.formats
+        )
+        games = Game.objects.build_games([(config, config.count) for config in configs])
+        Dispatch.objects.enqueue(callback_url, games)
+        self.started_at = timezone.now()
+        self.save(update_fields=["started_at"])
+        return games
+
+    def progress(self) -> t.Dict[str, int]:
+        """
+        Number of games in each state.
+        """
+        counts = dict(
+            Game.objects.filter(config__tournament=self)
+            .values_list("state")
+            .annotate(models.Count("id"))
+        )
+        return {state: counts.get(state, 0) for state in GameStates.values}
+
+
+class TournamentStandingQuerySet(models.QuerySet):
+    def record(self, game: Game, players: t.Sequence["GamePlayer"]):
+        """
+        Add a finished game's result to its tournament's standings, if it's part of one.
+        """
+        tournament_id = game.config.tournament_id
+        if tournament_id is None:
+            return
+        for player in players:
+            if game.is_draw:
+                outcome = dict(draws=models.F("draws") + 1, points=models.F("points") + 1)
+            elif game.winner_id == player.pk:
+                outcome = dict(wins=models.F("wins") + 1, points=models.F("points") + 2)
+            elif game.loser_id == player.pk:
+                outcome = dict(losses=models.F("losses") + 1)
+            else:
+                outcome = {}
+            self.filter(tournament_id=tournament_id, server__user=player.player_id).update(
+                played=models.F("played") + 1, **outcome
+            )
+
+    def ranked(self):
+        return self.select_related("server__user").order_by("-points", "-wins", "server_id")
+
+
+class TournamentStanding(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name="standings")
+    server = models.ForeignKey(BotServer, on_delete=models.CASCADE, related_name="+")
+    played = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    draws = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    points = models.IntegerField(default=0)
+    objects = TournamentStandingQuerySet.as_manager()
+
+    class Meta:
+        unique_together = [("tournament", "server")]
+
+    def __str__(self):
+        return f"{self.tournament} - {self.server}: {self.points}"
@@ -0,0 +1,144 @@
+"""
+Game state change notifications over postgres LISTEN/NOTIFY.
+
+Whoever changes a game's state calls `notify_state` inside the same transaction, so the
+notification is only delivered once the change is committed. Each process runs one listener
+thread with its own connection, which wakes up any requests waiting on that game. LISTEN doesn't
+work through pgbouncer in transaction mode, so the listener connects to DATABASE_LISTEN_URL
+instead when it's set.
+"""
+import asyncio
+import logging
+import select
+import threading
+import time
+import typing as t
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+import psycopg2
+from django.conf import settings
+from django.db import connection, connections
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cloudships_game_state"
+
+
+def notify_state(game_id: uuid.UUID, state: str):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, f"{game_id}:{state}"])
+
+
+class Waiter(t.Protocol):
+    def set(self) -> None:
+        ...
+
+
+class AsyncEvent(object):
+    """
+    An asyncio.Event the listener thread can set, for waiting without holding a thread.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_event_loop()
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class GameStateListener:
+    """
+    Hands out events that are set when a game's state changes. The listener thread starts on
+    the first subscription and reconnects if its connection drops or anything else goes wrong,
+    waking every waiter so they re-check the database rather than miss a change.
+    """
+
+    def __init__(self, channel: str, reconnect_delay: float = 1.0):
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._lock = threading.Lock()
+        self._waiters: t.Dict[str, t.Set[Waiter]] = defaultdict(set)
+        self._thread: t.Optional[threading.Thread] = None
+
+    @contextmanager
+    def subscribe(self, game_id: uuid.UUID, event: t.Optional[Waiter] = None) -> t.Iterator[t.Any]:
+        """
+        Subscribe before reading the game's state, otherwise a change between the read and the
+        subscription would be missed. Yields `event`, a threading.Event by default.
+        """
+        self._ensure_started()
+        key = str(game_id)
+        if event is None:
+            event = threading.Event()
+        with self._lock:
+            self._waiters[key].add(event)
+        try:
+            yield event
+        finally:
+            with self._lock:
+                self._waiters[key].discard(event)
+                if not self._waiters[key]:
+                    del self._waiters[key]
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="game-state-listener", daemon=True
+                )
+                self._thread.start()
+
+    def _wake(self, key: t.Optional[str] = None):
+        with self._lock:
+            if key is None:
+                events = [event for events in self._waiters.values() for event in events]
+            else:
+                events = list(self._waiters.get(key, ()))
+        for event in events:
+            try:
+                event.set()
+            except Exception:
+                # e.g. an AsyncEvent whose loop has closed, which mustn't stop the others
+                logger.exception("Couldn't wake a game state waiter")
+
+    def _run(self):
+        while True:
+            conn = None
+            try:
+                if settings.DATABASE_LISTEN_URL:
+                    params = dict(dsn=settings.DATABASE_LISTEN_URL)
+                else:
+                    params = connections["default"].get_connection_params()
+                conn = psycopg2.connect(**params)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        game_id, _, _state = conn.notifies.pop(0).payload.partition(":")
+                        self._wake(game_id)
+            except Exception:
+                # not just lost connections: anything that ended the thread would leave every
+                # waiter to time out, since the listener is only started once
+                logger.exception("Game state listener failed, reconnecting")
+                self._wake()
+                time.sleep(self.reconnect_delay)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+game_states = GameStateListener(CHANNEL)
@@ -0,0 +1,340 @@
+import typing as t
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from cloudships.models import (
+    AttackEnum,
+    BotServer,
+    Game,
+    GameConfig,
+    GameException,
+    GameMove,
+    GamePlayer,
+    GameSetup,
+    Orientation,
+    PlacementException,
+    ShipConfig,
+    Tournament,
+)
+
+# a ship of length 3 across the top left corner and one of length 1 in the bottom right
+SHIPS = [
+    dict(x=0, y=0, length=3, orientation=Orientation.HORIZONTAL),
+    dict(x=4, y=4, length=1, orientation=Orientation.HORIZONTAL),
+]
+
+
+class GameConfigViewQueryTests(TestCase):
+    """
+    The game config list and detail views take the same number of queries however many games
+    there are.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.player_1 = BotServer.objects.create(
+            user=User.objects.create(username="player_1"), server_address="http://player_1/"
+        )
+        cls.player_2 = BotServer.objects.create(
+            user=User.objects.create(username="player_2"), server_address="http://player_2/"
+        )
+
+    def create_config(self, games: int) -> GameConfig:
+        config = GameConfig.objects.create_config(10, [ShipConfig(3, 1)])
+        config.player_1, config.player_2 = self.player_1, self.player_2
+        config.save()
+        for game in config.build_games(games)[::2]:
+            # finish every other game so the losers are serialized too
+            game.state = Game.States.FINISHED
+            game.loser = game.players.first()
+            game.is_draw = False
+            game.save()
+        return config
+
+    def assertQueriesPerGameCount(self, url: str, queries: int):
+        config = self.create_config(2)
+        with self.assertNumQueries(queries):
+            self.client.get(url.format(pk=config.pk))
+        config = self.create_config(20)
+        with self.assertNumQueries(queries):
+            response = self.client.get(url.format(pk=config.pk))
+        return response.json()
+
+    def test_list(self):
+        data = self.assertQueriesPerGameCount("/api/games/", 1)
+        self.assertEqual([cfg["count"] for cfg in data["games"]], ["2", "20"])
+        self.assertNotIn("next", data)
+
+    def test_list_paginated(self):
+        data = self.assertQueriesPerGameCount("/api/games/?limit=1", 1)
+        self.assertEqual(len(data["games"]), 1)
+        self.assertIsNotNone(data["next"])
+
+    def test_detail(self):
+        data = self.assertQueriesPerGameCount("/api/games/{pk}/", 2)
+        self.assertEqual(len(data["data"]["games"]), 20)
+        self.assertEqual(
+            sum(game["loser"] is not None for game in data["data"]["games"]), 10,
+        )
+        self.assertNotIn("next", data)
+
+    def test_detail_paginated(self):
+        data = self.assertQueriesPerGameCount("/api/games/{pk}/?limit=5", 2)
+        self.assertEqual(len(data["data"]["games"]), 5)
+        self.assertIsNotNone(data["next"])
+
+
+class GameTestCase(TestCase):
+    """
+    Two bot servers, and games between them on a 5x5 board where both players place SHIPS.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_1 = User.objects.create(username="player_1")
+        cls.user_2 = User.objects.create(username="player_2")
+        cls.player_1 = BotServer.objects.create(user=cls.user_1, server_address="http://player_1/")
+        cls.player_2 = BotServer.objects.create(user=cls.user_2, server_address="http://player_2/")
+        cls.config = GameConfig.objects.create(
+            board_size=5,
+            ship_config=[ShipConfig(3, 1).asdict(), ShipConfig(1, 1).asdict()],
+            player_1=cls.player_1,
+            player_2=cls.player_2,
+        )
+
+    def start_game(self) -> Game:
+        """
+        A game in the attack phase.
+        """
+        (game,) = self.config.build_games(1)
+        for user in (self.user_1, self.user_2):
+            GamePlayer.objects.add_ships(game.pk, user, SHIPS)
+        game.refresh_from_db()
+        self.assertEqual(game.state, Game.States.ATTACK_PHASE)
+        return game
+
+    def finish_game(self, game: Game, state_1="finished", state_2="finished") -> Game:
+        Game.objects.finish_game(
+            game.pk,
+            [dict(username="player_1", state=state_1), dict(username="player_2", state=state_2)],
+        )
+        return Game.objects.get(pk=game.pk)
+
+
+class GameScoresTests(GameTestCase):
+    def test_in_progress(self):
+        game = self.start_game()
+        self.assertEqual(game.scores(), "0 vs 0")
+        for x, y in [(0, 0), (1, 0), (3, 3)]:
+            GamePlayer.objects.make_move(game.pk, self.user_1, x, y)
+        GamePlayer.objects.make_move(game.pk, self.user_2, 3, 3)
+        self.assertEqual(game.scores(), "3 vs 1")
+
+    def test_finished(self):
+        game = self.start_game()
+        GamePlayer.objects.make_move(game.pk, self.user_1, 3, 3)
+        game = self.finish_game(game)
+        self.assertEqual(game.scores(), "1 vs 0")
+        # stored, so later changes to the moves don't change it
+        GamePlayer.objects.filter(game=game, player=self.user_1).update(shot_count=5)
+        self.assertEqual(game.scores(), "5 vs 0")
+
+
+class SalvoTests(GameTestCase):
+    def setUp(self):
+        self.game = self.start_game()
+
+    def moves(self):
+        return list(
+            GameMove.objects.filter(player__game=self.game, player__player=self.user_1)
+            .order_by("id")
+            .values_list("x", "y", "result", "turn")
+        )
+
+    def test_stops_at_first_miss(self):
+        results = GamePlayer.objects.make_moves(
+            self.game.pk, self.user_1, [(0, 0), (4, 4), (3, 3), (1, 0)]
+        )
+        self.assertEqual(results, [AttackEnum.HIT, AttackEnum.SUNK, AttackEnum.MISS])
+        self.assertEqual(self.moves(), [(0, 0, "HIT", 0), (4, 4, "SUNK", 0), (3, 3, "MISS", 0)])
+        # the shot after the miss wasn't made, and the next one is on the following turn
+        self.assertEqual(
+            GamePlayer.objects.make_move(self.game.pk, self.user_1, 1, 0), AttackEnum.HIT
+        )
+        self.assertEqual(self.moves()[-1], (1, 0, "HIT", 1))
+
+    def test_rejects_invalid_shot_after_miss(self):
+        GamePlayer.objects.make_move(self.game.pk, self.user_1, 0, 0)
+        for shots, error in [
+            ([(3, 3), (0, 0)], "Attack[1] has already been made"),
+            ([(3, 3), (1, 0), (1, 0)], "Attack[2] has already been made"),
+            ([(3, 3), (5, 0)], "Attack[1] is out of bounds"),
+        ]:
+            with self.subTest(shots=shots):
+                with self.assertRaisesMessage(GameException, error):
+                    GamePlayer.objects.make_moves(self.game.pk, self.user_1, shots)
+                self.assertEqual(self.moves(), [(0, 0, "HIT", 0)])
+
+    def test_not_in_attack_phase(self):
+        self.finish_game(self.game)
+        with self.assertRaisesMessage(GameException, "Game is not in attack phase"):
+            GamePlayer.objects.make_moves(self.game.pk, self.user_1, [(3, 3)])
+        self.assertEqual(self.moves(), [])
+
+
+class CreateIfCurrentTests(GameTestCase):
+    def setUp(self):
+        self.game = self.start_game()
+        self.player = GamePlayer.objects.get(game=self.game, player=self.user_1)
+
+    def create(self, shot_count: int, x: int, y: int) -> bool:
+        return GameMove.objects.create_if_current(
+            self.player.pk, shot_count, x=x, y=y, result=AttackEnum.MISS, turn=shot_count
+        )
+
+    def test_current(self):
+        self.assertTrue(self.create(0, 3, 3))
+        self.assertTrue(self.create(1, 2, 2))
+        self.assertEqual(self.player.moves.count(), 2)
+
+    def test_stale_count(self):
+        self.assertTrue(self.create(0, 3, 3))
+        self.assertFalse(self.create(0, 2, 2))
+        self.assertFalse(self.create(2, 2, 2))
+        self.assertEqual(self.player.moves.count(), 1)
+
+    def test_not_in_attack_phase(self):
+        self.finish_game(self.game)
+        self.assertFalse(self.create(0, 3, 3))
+        self.assertEqual(self.player.moves.count(), 0)
+
+    def test_make_move_with_missed_moves(self):
+        self.assertEqual(
+            GamePlayer.objects.make_move(self.game.pk, self.user_1, 0, 0), AttackEnum.HIT
+        )
+        # as if made through another process, so this process' index hasn't seen it
+        GameMove.objects.create(player=self.player, x=1, y=0, result=AttackEnum.HIT)
+        self.assertEqual(
+            GamePlayer.objects.make_move(self.game.pk, self.user_1, 2, 0), AttackEnum.SUNK
+        )
+
+    def test_duplicate(self):
+        self.assertTrue(self.create(0, 3, 3))
+        # even with the right count, unique_move leaves the first one alone
+        self.assertFalse(self.create(1, 3, 3))
+        self.assertEqual(list(self.player.moves.values_list("x", "y", "turn")), [(3, 3, 0)])
+        with self.assertRaisesMessage(GameException, "Move has already been made"):
+            GamePlayer.objects.make_move(self.game.pk, self.user_1, 3, 3)
+
+
+class PlacementTests(GameTestCase):
+    def test_valid(self):
+        self.config.check_placement(SHIPS)
+
+    def test_reports_every_problem(self):
+        ships = [
+            *SHIPS,
+            # touching the first ship
+            dict(x=1, y=1, length=1, orientation=Orientation.HORIZONTAL),
+            dict(x=3, y=2, length=3, orientation=Orientation.HORIZONTAL),
+            dict(x=0, y=3, length=2, orientation=Orientation.VERTICAL),
+        ]
+        with self.assertRaises(PlacementException) as cm:
+            self.config.check_placement(ships)
+        self.assertEqual(
+            cm.exception.errors,
+            [
+                "Ship[2] is overlapping another ship",
+                "Ship[3] is out of bounds",
+                "Invalid ship configuration: expected 1 ships of length 1, got 2",
+                "Invalid ship configuration: expected 0 ships of length 2, got 1",
+                "Invalid ship configuration: expected 1 ships of length 3, got 2",
+            ],
+        )
+
+    def test_missing_ships(self):
+        with self.assertRaises(PlacementException) as cm:
+            self.config.check_placement(SHIPS[:1])
+        self.assertEqual(
+            cm.exception.errors,
+            ["Invalid ship configuration: expected 1 ships of length 1, got 0"],
+        )
+
+    def test_nothing_saved(self):
+        (game,) = self.config.build_games(1)
+        with self.assertRaises(PlacementException):
+            GamePlayer.objects.add_ships(game.pk, self.user_1, SHIPS * 2)
+        self.assertFalse(GameSetup.objects.filter(player__game=game).exists())
+
+
+class FinishGameTests(GameTestCase):
+    def setUp(self):
+        self.game = self.start_game()
+
+    def attack(self, user: User, *shots):
+        for x, y in shots:
+            GamePlayer.objects.make_move(self.game.pk, user, x, y)
+
+    def assertResult(self, game: Game, loser: t.Optional[User], winner: t.Optional[User]):
+        self.assertEqual(game.state, Game.States.FINISHED)
+        self.assertEqual(game.loser and game.loser.player, loser)
+        self.assertEqual(game.winner and game.winner.player, winner)
+        self.assertEqual(game.is_draw, loser is None)
+
+    def test_loser_made_last_two_moves(self):
+        self.attack(self.user_1, (3, 3))
+        self.attack(self.user_2, (0, 0), (2, 2))
+        self.assertResult(self.finish_game(self.game), loser=self.user_2, winner=self.user_1)
+
+    def test_draw(self):
+        self.attack(self.user_1, (3, 3))
+        self.attack(self.user_2, (3, 3))
+        self.assertResult(self.finish_game(self.game), loser=None, winner=None)
+
+    def test_dnf_loses(self):
+        self.attack(self.user_1, (3, 3))
+        self.attack(self.user_2, (0, 0), (2, 2))
+        game = self.finish_game(self.game, state_1="dnf")
+        self.assertResult(game, loser=self.user_1, winner=self.user_2)
+
+    def test_both_dnf(self):
+        game = self.finish_game(self.game, state_1="dnf", state_2="dnf")
+        self.assertResult(game, loser=None, winner=None)
+
+    def test_unplaced_ships_lose(self):
+        (game,) = self.config.build_games(1)
+        GamePlayer.objects.add_ships(game.pk, self.user_1, SHIPS)
+        self.assertResult(self.finish_game(game), loser=self.user_2, winner=self.user_1)
+
+    def test_counts(self):
+        self.attack(self.user_1, (0, 0), (3, 3), (1, 0))
+        self.finish_game(self.game)
+        self.assertEqual(
+            list(self.game.players.order_by("id").values_list("move_count", "shot_count")),
+            [(2, 3), (0, 0)],
+        )
+
+
+class TournamentStandingTests(GameTestCase):
+    def test_finish_twice(self):
+        tournament = Tournament.objects.create_tournament(
+            "Test", [self.player_1, self.player_2], [(5, self.config.ships)]
+        )
+        (self.game,) = tournament.start("http://testserver/")
+        for user in (self.user_1, self.user_2):
+            GamePlayer.objects.add_ships(self.game.pk, user, SHIPS)
+        GamePlayer.objects.make_move(self.game.pk, self.user_1, 3, 3)
+        GamePlayer.objects.make_move(self.game.pk, self.user_2, 0, 0)
+        GamePlayer.objects.make_move(self.game.pk, self.user_2, 2, 2)
+        self.finish_game(self.game)
+        # the dispatcher can report a game again, e.g. after retrying a timed out request
+        self.finish_game(self.game)
+        self.assertEqual(
+            list(
+                tournament.standings.ranked().values_list(
+                    "server__user__username", "played", "wins", "draws", "losses", "points"
+                )
+            ),
+            [("player_1", 1, 1, 0, 0, 2), ("player_2", 1, 0, 0, 1, 0)],
+        )
@@ -8,18 +8,24 @@ from .views import (
     finish_game,
     game_status,
     join_game,
+    metrics,
     place_ships,
     players,
+    salvo,
+    wait_for_game,
 )
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/game/<uuid:game_id>/", game_status),
+    path("api/game/<uuid:game_id>/wait/", wait_for_game),
     path("api/game/<uuid:game_id>/join/", join_game),
     path("api/game/<uuid:game_id>/place/", place_ships),
     path("api/game/<uuid:game_id>/attack/", attack),
+    path("api/game/<uuid:game_id>/salvo/", salvo),
     path("api/game/<uuid:game_id>/finish/", finish_game),
     path("api/games/", GameConfigListView.as_view()),
     path("api/games/<int:pk>/", GameConfigDetailView.as_view()),
     path("api/player/", players),
+    path("metrics/", metrics),
 ]
@@ -1,9 +1,25 @@
+import typing as t
+
+from cloudships.authentication import CachedTokenAuthentication
 from cloudships.dispatcher import verify_game_secret
-from cloudships.models import BotServer, Game, GameConfig, GameException, GamePlayer, Orientation
-from django.http import Http404, JsonResponse
+from cloudships.metrics import TimedSerializer, render_metrics
+from cloudships.models import (
+    BotServer,
+    Game,
+    GameConfig,
+    GameException,
+    GamePlayer,
+    Orientation,
+    PlacementException,
+    attack_statuses,
+)
+from cloudships.notify import game_states
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse, JsonResponse
 from rest_framework import serializers
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 
@@ -13,24 +29,21 @@ class ShipConfigSerializer(serializers.Serializer):
     count = serializers.IntegerField(required=True)
 
 
-class GameDetailSerializer(serializers.Serializer):
+class GameDetailSerializer(TimedSerializer):
     state = serializers.CharField()
     id = serializers.UUIDField()
     loser = serializers.SerializerMethodField(method_name="get_loser")
     is_draw = serializers.SerializerMethodField(method_name="get_is_draw")
 
     def get_loser(self, game: Game):
-        if game.state != Game.States.FINISHED:
-            return None
-        loser = game.loser
-        if loser is None:
+        if game.state != Game.States.FINISHED or game.loser is None:
             return None
-        return loser.player.username
+        return game.loser.username
 
     def get_is_draw(self, game: Game):
         if game.state != Game.States.FINISHED:
             return None
-        return game.loser is None
+        return game.is_draw
 
 
 class GameStateSerializer(GameDetailSerializer):
@@ -42,7 +55,7 @@ class GameStateSerializer(GameDetailSerializer):
         if game.state != Game.States.FINISHED:
             return []
         return [
-            dict(x=move.x, y=move.y, player=move.player.player.username, result=move.result)
+            dict(x=move.x, y=move.y, player=move.player.username, result=move.result)
             for move in game.move_stream
         ]
 
@@ -59,6 +72,15 @@ class AttackSerializer(serializers.Serializer):
     y = serializers.IntegerField(required=True)
 
 
+class SalvoSerializer(serializers.Serializer):
+    attacks = AttackSerializer(many=True, allow_empty=False)
+
+
+class WaitSerializer(serializers.Serializer):
+    state = serializers.ChoiceField(Game.States.choices, required=False)
+    timeout = serializers.FloatField(default=25, min_value=0, max_value=60)
+
+
 class FinishedPlayerSerializer(serializers.Serializer):
     username = serializers.CharField(required=True)
     state = serializers.CharField(required=True)
@@ -70,7 +92,7 @@ class FinishGameSerializer(serializers.Serializer):
 
 
 @api_view(["POST"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def join_game(request, game_id=None):
     try:
@@ -80,18 +102,55 @@ def join_game(request, game_id=None):
         return JsonResponse(dict(errors=[str(e)]), status=400)
 
 
+def game_state(game_id, user) -> t.Optional[dict]:
+    if attack_statuses is not None:
+        state = attack_statuses.get((game_id, user.pk))
+        if state:
+            return state
+    player = GamePlayer.objects.find_game(game_id, user).select_related("game").first()
+    if player is None:
+        return None
+    state = GameStateSerializer(instance=player.game).data
+    if attack_statuses is not None and state["state"] == Game.States.ATTACK_PHASE:
+        attack_statuses.add((game_id, user.pk), state)
+    return state
+
+
 @api_view(["GET"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def game_status(request, game_id=None):
-    player = GamePlayer.objects.find_game(game_id, request.user).select_related("game").first()
-    if player is None:
+    state = game_state(game_id, request.user)
+    if state is None:
         raise Http404
-    return JsonResponse(dict(game=GameStateSerializer(instance=player.game).data))
+    return JsonResponse(dict(game=state))
+
+
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def wait_for_game(request, game_id=None):
+    """
+    Long poll for the game state. Responds as soon as the game is no longer in `state`, or with
+    the unchanged game after `timeout` seconds.
+    """
+    form = WaitSerializer(data=request.query_params)
+    if not form.is_valid():
+        return JsonResponse(dict(errors=form.errors), status=400)
+    with game_states.subscribe(game_id) as changed:
+        state = game_state(game_id, request.user)
+        if state is None:
+            raise Http404
+        if state["state"] == form.validated_data.get("state"):
+            # don't hold on to a database connection while we wait
+            connection.close()
+            if changed.wait(form.validated_data["timeout"]):
+                state = game_state(game_id, request.user)
+    return JsonResponse(dict(game=state))
 
 
 @api_view(["POST"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def place_ships(request, game_id=None):
     form = ShipSerializer(data=request.data, many=True)
@@ -100,12 +159,14 @@ def place_ships(request, game_id=None):
     try:
         GamePlayer.objects.add_ships(game_id, request.user, form.validated_data)
         return JsonResponse(dict(), status=200)
+    except PlacementException as e:
+        return JsonResponse(dict(errors=e.errors), status=400)
     except GameException as e:
         return JsonResponse(dict(errors=[str(e)]), status=400)
 
 
 @api_view(["POST"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def attack(request, game_id=None):
     form = AttackSerializer(data=request.data)
@@ -120,6 +181,24 @@ def attack(request, game_id=None):
         return JsonResponse(dict(errors=[str(e)]), status=400)
 
 
+@api_view(["POST"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def salvo(request, game_id=None):
+    form = SalvoSerializer(data=request.data)
+    if not form.is_valid():
+        return JsonResponse(dict(errors=form.errors), status=400)
+    attacks = form.validated_data["attacks"]
+    try:
+        results = GamePlayer.objects.make_moves(
+            game_id, request.user, [(attack["x"], attack["y"]) for attack in attacks]
+        )
+        results = [dict(result=result, **attack) for attack, result in zip(attacks, results)]
+        return JsonResponse(dict(results=results))
+    except GameException as e:
+        return JsonResponse(dict(errors=[str(e)]), status=400)
+
+
 @api_view(["POST"])
 def finish_game(request, game_id=None):
     form = FinishGameSerializer(data=request.data)
@@ -134,45 +213,84 @@ def finish_game(request, game_id=None):
         return JsonResponse(dict(errors=[str(e)]), status=400)
 
 
-class GameConfigSerializer(serializers.Serializer):
+class GameConfigSerializer(TimedSerializer):
     board_size = serializers.IntegerField()
     id = serializers.IntegerField()
     player_1 = serializers.CharField(source="player_1.user.username")
     player_2 = serializers.CharField(source="player_2.user.username")
-    count = serializers.CharField(source="game_count")
+    count = serializers.CharField(source="num_games")
 
 
-class GameConfigDetailSerializer(GameConfigSerializer):
-    games = GameDetailSerializer(source="game_set", many=True)
+class GameConfigPagination(CursorPagination):
+    """
+    Only paginates when asked to with ?limit= (the next and previous links keep it), so clients
+    expecting everything in one response still get it.
+    """
+
+    ordering = "id"
+    page_size = 100
+    page_size_query_param = "limit"
+    max_page_size = 1000
+    paginated = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.page_size_query_param not in request.query_params:
+            return None
+        self.paginated = True
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def get_links(self) -> dict:
+        if not self.paginated:
+            return {}
+        return dict(next=self.get_next_link(), previous=self.get_previous_link())
+
+
+class GamePagination(GameConfigPagination):
+    ordering = "-created_at"
 
 
 class GameConfigListView(APIView):
     def get(self, request, format=None):
-        cfgs = GameConfig.objects.all()
-        serializer = GameConfigSerializer(cfgs, many=True)
-        return JsonResponse(dict(games=serializer.data))
+        paginator = GameConfigPagination()
+        cfgs = GameConfig.objects.with_summary().order_by("id")
+        page = paginator.paginate_queryset(cfgs, request, view=self)
+        serializer = GameConfigSerializer(cfgs if page is None else page, many=True)
+        return JsonResponse(dict(games=serializer.data, **paginator.get_links()))
 
 
 class GameConfigDetailView(APIView):
     def get_object(self, pk):
         try:
-            return GameConfig.objects.get(pk=pk)
+            return GameConfig.objects.with_summary().get(pk=pk)
         except GameConfig.DoesNotExist:
             raise Http404
 
     def get(self, request, pk, format=None):
         cfg = self.get_object(pk)
-        serializer = GameConfigDetailSerializer(cfg)
-        return JsonResponse(dict(data=serializer.data))
+        paginator = GamePagination()
+        games = cfg.game_set.select_related("loser__player")
+        page = paginator.paginate_queryset(games, request, view=self)
+        data = GameConfigSerializer(cfg).data
+        data["games"] = GameDetailSerializer(games if page is None else page, many=True).data
+        return JsonResponse(dict(data=data, **paginator.get_links()))
 
 
-class PlayerSerializer(serializers.Serializer):
+class PlayerSerializer(TimedSerializer):
     name = serializers.CharField(required=True, source="user.username")
 
 
 @api_view(["GET"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def players(request):
     all_players = BotServer.objects.all()
     return JsonResponse(PlayerSerializer(instance=all_players, many=True).data, safe=False)
+
+
+def metrics(request):
+    """
+    Request metrics for Prometheus, only for METRICS_ALLOWED_IPS.
+    """
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4")
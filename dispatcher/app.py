@@ -0,0 +1,160 @@
+"""
+Dispatches games to bot servers and reports the outcome back to the engine.
+
+POST / with {players: [{server_url, username}], game_id, callback_url, secret} returns
+straight away. Each player's server is then notified of the game (the request lasts for as
+long as the bot plays), and once both have finished or timed out the results are posted to
+the engine's /finish/ endpoint.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import time
+import typing as t
+from collections import defaultdict
+from urllib.parse import urljoin
+
+import httpx
+from fastapi import FastAPI
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+log = logging.getLogger("dispatcher")
+
+# seconds a bot has to play a game before it's marked as dnf
+NOTIFY_TIMEOUT = float(os.environ.get("NOTIFY_TIMEOUT", 30))
+# games a single bot server is sent at once by this process, the rest wait their turn. The engine
+# already limits each server to its BotServer.max_concurrent_games, so this is only a backstop:
+# when it's the lower of the two it wins, and the games the engine has sent over it wait here.
+MAX_GAMES_PER_SERVER = int(os.environ.get("MAX_GAMES_PER_SERVER", 4))
+FINISH_ATTEMPTS = 3
+
+app = FastAPI()
+client: t.Optional[httpx.AsyncClient] = None
+server_slots: t.Dict[str, asyncio.Semaphore] = defaultdict(
+    lambda: asyncio.Semaphore(MAX_GAMES_PER_SERVER)
+)
+# keep references to running games so they aren't garbage collected
+running: t.Set[asyncio.Task] = set()
+
+
+class Histogram(object):
+    """
+    Prometheus style cumulative histogram.
+    """
+
+    buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+    def __init__(self, name: str, help: str, label: str):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.counts: t.Dict[str, t.List[int]] = defaultdict(lambda: [0] * len(self.buckets))
+        self.sums: t.Dict[str, float] = defaultdict(float)
+
+    def observe(self, value: str, seconds: float):
+        counts = self.counts[value]
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                counts[i] += 1
+        self.sums[value] += seconds
+
+    def render(self) -> t.List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, counts in self.counts.items():
+            label = f'{self.label}="{value}"'
+            for bound, count in zip(self.buckets, counts):
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {self.sums[value]}")
+            lines.append(f"{self.name}_count{{{label}}} {counts[-1]}")
+        return lines
+
+
+notify_latency = Histogram(
+    "dispatcher_notify_seconds", "Time taken for a bot to play a game", label="state"
+)
+slot_wait = Histogram(
+    "dispatcher_slot_wait_seconds", "Time a game waited for a bot server slot", label="server"
+)
+
+
+@app.on_event("startup")
+async def startup():
+    global client
+    client = httpx.AsyncClient(
+        timeout=httpx.Timeout(NOTIFY_TIMEOUT),
+        pool_limits=httpx.PoolLimits(soft_limit=MAX_GAMES_PER_SERVER, hard_limit=1000),
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if client is not None:
+        await client.aclose()
+
+
+async def notify_player(player: dict, game_id: str, url: str) -> dict:
+    server_url, username = player["server_url"], player["username"]
+    start = time.perf_counter()
+    try:
+        # wait_for cancels the request when the bot runs out of time
+        response = await asyncio.wait_for(
+            client.post(server_url, json=dict(game_id=game_id, url=url)),
+            timeout=NOTIFY_TIMEOUT,
+        )
+        response.raise_for_status()
+        state = "finished"
+    except (asyncio.TimeoutError, httpx.HTTPError) as e:
+        log.warning("%s did not finish %s: %r", username, game_id, e)
+        state = "dnf"
+    notify_latency.observe(state, time.perf_counter() - start)
+    return dict(username=username, state=state)
+
+
+async def run_game(players: t.List[dict], game_id: str, callback_url: str, secret: str):
+    # Both bots need to be playing at once, so hold a slot on each server before telling either
+    # about the game. Taking them in the same order for every game means two games can't each
+    # hold one server while waiting for the other.
+    queued = time.perf_counter()
+    async with contextlib.AsyncExitStack() as slots:
+        for server_url in sorted({player["server_url"] for player in players}):
+            await slots.enter_async_context(server_slots[server_url])
+            slot_wait.observe(server_url, time.perf_counter() - queued)
+        results = await asyncio.gather(
+            *(notify_player(player, game_id, callback_url) for player in players)
+        )
+    finish_url = urljoin(callback_url, f"/api/game/{game_id}/finish/")
+    for attempt in range(1, FINISH_ATTEMPTS + 1):
+        try:
+            response = await client.post(finish_url, json=dict(players=results, secret=secret))
+            response.raise_for_status()
+            return
+        except httpx.HTTPError as e:
+            log.warning("Failed to finish %s (attempt %s): %r", game_id, attempt, e)
+            await asyncio.sleep(attempt)
+
+
+@app.post("/")
+async def dispatch(request: Request):
+    try:
+        body = await request.json()
+        players, game_id, callback_url = body["players"], body["game_id"], body["callback_url"]
+    except (ValueError, KeyError, TypeError):
+        return Response(status_code=400)
+    if not players or not game_id or not callback_url:
+        return Response(status_code=400)
+    # respond immediately, the game plays out in the background
+    task = asyncio.create_task(run_game(players, game_id, callback_url, body.get("secret")))
+    running.add(task)
+    task.add_done_callback(running.discard)
+    return Response()
+
+
+@app.get("/metrics")
+async def metrics():
+    lines = notify_latency.render() + slot_wait.render()
+    lines.append("# TYPE dispatcher_running_games gauge")
+    lines.append(f"dispatcher_running_games {len(running)}")
+    return PlainTextResponse("\n".join(lines) + "\n")
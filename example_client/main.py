@@ -4,7 +4,6 @@ import operator
 import os
 import random
 import sys
-import time
 from dataclasses import asdict, dataclass
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from urllib.parse import urljoin
@@ -152,13 +151,15 @@ def phase_attack(session, url, game_id, config):
 
 
 def wait_for_state(session, url, game_id, state):
+    params = {}
     while True:
-        response = session.get(urljoin(url, f"/api/game/{game_id}/")).json()
+        # the server holds the request until the game leaves the state we last saw
+        response = session.get(urljoin(url, f"/api/game/{game_id}/wait/"), params=params).json()
         if response["game"]["state"] == "finished":
             raise Exception("Game state finished. Abort")
         if response["game"]["state"] == state:
             break
-        time.sleep(5)
+        params = dict(state=response["game"]["state"])
 
 
 def play_game(url: str, token: str, game_id: str):
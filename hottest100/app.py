@@ -3,10 +3,12 @@ import os
 import httpx
 from fastapi import FastAPI, Body
 
-from engine import HttpCoordinator
+from engine import ENGINES, HttpCoordinator
 
 
 app = FastAPI()
+# ENGINE=sampling to attack with SamplingEngine instead
+engine_class = ENGINES[os.environ.get("ENGINE", "parity")]
 
 
 @app.post("/")
@@ -15,7 +17,7 @@ async def start_game(url: str = Body(...), game_id: str = Body(...)):
     token = os.environ.get("GAME_TOKEN")
     headers = {"Authorization": f"Token {token}", "user-agent": "httpx: hottest100"}
     async with httpx.AsyncClient(headers=headers) as client:
-        coordinator = HttpCoordinator(client, url, game_id)
+        coordinator = HttpCoordinator(client, url, game_id, engine_class=engine_class)
         await coordinator.run()
     return {}
 
@@ -5,7 +5,7 @@ import statistics
 import sys
 import time
 import typing as t
-from collections import deque
+from collections import Counter, deque
 from copy import deepcopy
 from dataclasses import dataclass
 from urllib.parse import urljoin
@@ -328,33 +328,85 @@ class Coordinator:
         return True
 
 
+class PointSet:
+    """
+    Points with O(1) add, discard and random choice: a list, and where each point is in it.
+    """
+
+    def __init__(self, points: t.Iterable[Point] = ()):
+        self.points: t.List[Point] = []
+        self.index: t.Dict[Point, int] = {}
+        for point in points:
+            self.add(point)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __contains__(self, point: Point) -> bool:
+        return point in self.index
+
+    def add(self, point: Point):
+        if point not in self.index:
+            self.index[point] = len(self.points)
+            self.points.append(point)
+
+    def discard(self, point: Point):
+        i = self.index.pop(point, None)
+        if i is None:
+            return
+        # move the last point into the gap
+        last = self.points.pop()
+        if i < len(self.points):
+            self.points[i] = last
+            self.index[last] = i
+
+    def choice(self) -> Point:
+        return random.choice(self.points)
+
+
 @dataclass
 class Engine:
     opponent_board: Board
     our_board: t.Optional[Board] = None
     size: int = 10
 
-    def __init__(self, size=10):
+    def __init__(self, size=10, ship_config=None):
         self.size = size
         self.opponent_board = Board.empty(size=size)
-        points = [
-            (x, y)
-            for x in [2 * i + 1 for i in range(10 >> 1)]
-            for y in [2 * i for i in range(10 >> 1)]
-        ]
-        self.attack_points = set(points).union(map(lambda t: t[::-1], points))
+        if ship_config is None:
+            ship_config = SHIP_CONFIG
+        # length -> ships of that length still afloat
+        self.remaining = Counter({ship["length"]: ship["count"] for ship in ship_config})
+        self.sunk_ships: t.List[t.Set[Point]] = []
+        # every point not attacked yet, and those of them on the hunting pattern
+        self.unknown_points = PointSet(Point(x, y) for x in range(size) for y in range(size))
+        self.parity = 0
+        self.attack_points = PointSet()
+        self._attack_update_parity()
         self.is_attack_mode_target = False
         self.attack_queue = deque()
 
+    def _attack_update_parity(self):
+        # Diagonals `parity` apart cross every ship at least that long, so hunt along them using the
+        # shortest ship still afloat.
+        parity = min((length for length, count in self.remaining.items() if count), default=1)
+        if parity == self.parity:
+            return
+        self.parity = parity
+        offset = random.randrange(parity)
+        self.attack_points = PointSet(
+            p for p in self.unknown_points.points if (p.x + p.y) % parity == offset
+        )
+
+    def _attacked(self, point: Point):
+        self.unknown_points.discard(point)
+        self.attack_points.discard(point)
+
     def _attack_get_random_disparate_point_with_state_unknown(self) -> Point:
-        while len(self.attack_points):
-            (x, y) = random.choice(tuple(self.attack_points))
-            self.attack_points.remove((x, y))
-            if self.opponent_board.tiles[x][y].state == State.Unknown:
-                return Point(x, y)
-        # If all else fails and more, just return a random point regardless of state.
-        [x, y] = random.sample(range(self.size), 2)
-        return Point(x, y)
+        if len(self.attack_points):
+            return self.attack_points.choice()
+        # The pattern is exhausted, so any point not attacked yet.
+        return self.unknown_points.choice()
 
     def _attack_get_target_mode_point(self) -> Point:
         while len(self.attack_queue):
@@ -386,12 +438,35 @@ class Engine:
         else:
             return self._attack_get_random_disparate_point_with_state_unknown()
 
+    def _record_sunk(self, point: Point):
+        # ships can't touch, so the ship is every hit joined to this one that isn't already sunk
+        sunk_points = set().union(*self.sunk_ships)
+        ship = {point}
+        queue = deque([point])
+        while queue:
+            p = queue.popleft()
+            for n in (Point(p.x - 1, p.y), Point(p.x + 1, p.y), Point(p.x, p.y - 1), Point(p.x, p.y + 1)):
+                if (
+                    0 <= n.x < self.size
+                    and 0 <= n.y < self.size
+                    and n not in ship
+                    and n not in sunk_points
+                    and self.opponent_board.tiles[n.x][n.y].state == State.Hit
+                ):
+                    ship.add(n)
+                    queue.append(n)
+        self.sunk_ships.append(ship)
+        if self.remaining[len(ship)] > 0:
+            self.remaining[len(ship)] -= 1
+        self._attack_update_parity()
+
     async def play(self, coordinator: Coordinator, total_opponent_tiles: int):
         response = AttackResponse.Miss
         hits = 0
         while hits < total_opponent_tiles:
             attack = self.get_attack()
             response = await coordinator.attack(attack)
+            self._attacked(attack)
             tile = self.opponent_board.tiles[attack.x][attack.y]
             if response is AttackResponse.Hit:
                 tile.state = State.Hit
@@ -400,9 +475,11 @@ class Engine:
             elif response is AttackResponse.Sunk:
                 hits += 1
                 tile.state = State.Hit
+                self._record_sunk(attack)
             elif response is AttackResponse.Win:
                 hits += 1
                 tile.state = State.Hit
+                self._record_sunk(attack)
             elif response is AttackResponse.Miss:
                 tile.state = State.Empty
             elif response is AttackResponse.Invalid:
@@ -410,11 +487,154 @@ class Engine:
         self.opponent_board.print_board()
 
 
+class SamplingEngine(Engine):
+    """
+    Samples whole fleets consistent with everything known about the opponent's board: misses,
+    hits that aren't sunk yet, sunk ships, and ships not touching (diagonals included). Attacks
+    the unknown point the most sampled fleets put a ship on.
+
+    Sampling stops after `budget` seconds or `max_samples` fleets each move. If no fleet is found
+    in time, falls back to Engine's hunt and target.
+    """
+
+    budget: float = 0.05
+    max_samples: int = 2000
+    # attempts at a random placement for a ship before giving up on the fleet
+    tries: int = 20
+
+    def __init__(self, size=10, ship_config=None, budget=None):
+        super().__init__(size=size, ship_config=ship_config)
+        if budget is not None:
+            self.budget = budget
+        self.rng = random.Random()
+        # length -> (ship mask, mask of the ship and its neighbours) for every placement on the board
+        self.placements = {length: self._placements(length) for length in self.remaining}
+
+    def _bit(self, x: int, y: int) -> int:
+        return 1 << (x * self.size + y)
+
+    def _zone(self, points) -> int:
+        """
+        The points and all of their neighbours, diagonals included.
+        """
+        zone = 0
+        for x, y in points:
+            for nx in range(max(0, x - 1), min(self.size, x + 2)):
+                for ny in range(max(0, y - 1), min(self.size, y + 2)):
+                    zone |= self._bit(nx, ny)
+        return zone
+
+    def _placements(self, length: int) -> t.List[t.Tuple[int, int]]:
+        steps = [(1, 0)] if length == 1 else [(1, 0), (0, 1)]
+        placements = []
+        for dx, dy in steps:
+            for x in range(self.size - dx * (length - 1)):
+                for y in range(self.size - dy * (length - 1)):
+                    points = [(x + dx * i, y + dy * i) for i in range(length)]
+                    mask = 0
+                    for px, py in points:
+                        mask |= self._bit(px, py)
+                    placements.append((mask, self._zone(points)))
+        return placements
+
+    @staticmethod
+    def _indexes(mask: int) -> t.Iterator[int]:
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def get_attack(self) -> Point:
+        counts = self.sample()
+        if counts is None:
+            return super().get_attack()
+        best = max(range(len(counts)), key=counts.__getitem__)
+        if counts[best] == 0:
+            return super().get_attack()
+        return Point(*divmod(best, self.size))
+
+    def sample(self) -> t.Optional[t.List[int]]:
+        """
+        How many sampled fleets cover each unknown point (indexed x * size + y), or None if no
+        fleet could be found.
+        """
+        deadline = time.perf_counter() + self.budget
+        sunk_points = set().union(*self.sunk_ships)
+        empty = hits = 0
+        for x, row in enumerate(self.opponent_board.tiles):
+            for y, tile in enumerate(row):
+                if tile.state == State.Empty:
+                    empty |= self._bit(x, y)
+                elif tile.state == State.Hit and Point(x, y) not in sunk_points:
+                    hits |= self._bit(x, y)
+        blocked = empty | self._zone((p.x, p.y) for p in sunk_points)
+
+        lengths = sorted(self.remaining.elements(), reverse=True)
+        # a ship can't cover a blocked point, or touch a hit without covering it
+        valid = {
+            length: [(m, zone) for m, zone in self.placements[length] if not m & blocked and not zone & hits & ~m]
+            for length in set(lengths)
+        }
+        through = {
+            i: {length: [(m, zone) for m, zone in placements if m >> i & 1] for length, placements in valid.items()}
+            for i in self._indexes(hits)
+        }
+
+        counts = [0] * (self.size * self.size)
+        samples = 0
+        while samples < self.max_samples and time.perf_counter() < deadline:
+            fleet = self._sample_fleet(valid, through, hits, lengths)
+            if fleet is None:
+                continue
+            samples += 1
+            for i in self._indexes(fleet & ~hits):
+                counts[i] += 1
+        return counts if samples else None
+
+    def _sample_fleet(self, valid, through, hits: int, lengths: t.List[int]) -> t.Optional[int]:
+        remaining = Counter(lengths)
+        occupied = fleet = 0
+        # explain every hit first, with a ship through its lowest unexplained point
+        uncovered = hits
+        while uncovered:
+            i = (uncovered & -uncovered).bit_length() - 1
+            options = [
+                (length, m, zone)
+                for length, count in remaining.items()
+                if count
+                for m, zone in through[i][length]
+                if not m & occupied
+            ]
+            if not options:
+                return None
+            length, m, zone = self.rng.choice(options)
+            remaining[length] -= 1
+            occupied |= zone
+            fleet |= m
+            uncovered &= ~m
+        # then the rest anywhere they fit, biggest first
+        for length in sorted(remaining.elements(), reverse=True):
+            placements = valid[length]
+            for _ in range(self.tries if placements else 0):
+                m, zone = self.rng.choice(placements)
+                if not m & occupied:
+                    break
+            else:
+                return None
+            occupied |= zone
+            fleet |= m
+        return fleet
+
+
+ENGINES = {"parity": Engine, "sampling": SamplingEngine}
+
+
 class HttpCoordinator:
-    def __init__(self, session: AsyncClient, url: str, game_id: str):
+    def __init__(self, session: AsyncClient, url: str, game_id: str, engine_class=Engine):
         self.session = session
         self.url = url
         self.game_id = game_id
+        self.engine_class = engine_class
         self.moves = 0
         self.last_hit = False
 
@@ -453,8 +673,7 @@ class HttpCoordinator:
         ready = await self.wait("attack")
         if not ready:
             raise ServerError("Server didn't transition into attack phase")
-        # TODO: Engine accepts a ship_config
-        self.engine = engine = Engine(size=size)
+        self.engine = engine = self.engine_class(size=size, ship_config=ship_config)
         total_opponent_tiles = sum(map(lambda s: s["length"] * s["count"], ship_config))
         print(f"setup complete, attacking {self.game_id=}")
         await engine.play(self, total_opponent_tiles)
@@ -474,15 +693,21 @@ class HttpCoordinator:
             for ship in ships
         ]
 
-    async def wait(self, state) -> bool:
-        retries = 0
-        while (retries := retries + 1) <= 15:
-            response = await self.session.get(urljoin(self.url, f"/api/game/{self.game_id}/"))
+    async def wait(self, state, timeout=30) -> bool:
+        url = urljoin(self.url, f"/api/game/{self.game_id}/wait/")
+        params = {}
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            # the server holds the request until the game leaves the state we last saw
+            params["timeout"] = remaining
+            response = await self.session.get(url, params=params, timeout=remaining + 5)
             if response.status_code == 200:
                 data = response.json()
                 if data["game"]["state"] == state:
                     return True
-            await asyncio.sleep(2)
+                params["state"] = data["game"]["state"]
+            else:
+                await asyncio.sleep(2)
         return False
 
 
@@ -540,14 +765,38 @@ class TestCoordinator(Coordinator):
         await self.engine.play(self, hits_required)
 
 
-async def test_engine(games: int):
-    size = 10
+# the README's formats for the bigger boards
+TEST_SHIP_CONFIGS = {
+    10: SHIP_CONFIG,
+    20: [{"count": 10, "length": 1}, {"count": 1, "length": 4}],
+    30: [
+        {"count": 2, "length": 5},
+        {"count": 2, "length": 4},
+        {"count": 4, "length": 3},
+        {"count": 2, "length": 2},
+    ],
+}
+
+
+async def test_engine(games: int, engine_class=Engine, size: int = 10):
     history: t.List[int] = []
+    slowest = 0.0
     debug = True if games <= 50 else False
     placer = ShipPlacer()
+    ship_config = TEST_SHIP_CONFIGS[size]
     for x in range(games):
-        ships = placer.random_ships(size=size)
-        engine = Engine(size=size)
+        ships = placer.random_ships(size=size, ship_config=ship_config)
+        engine = engine_class(size=size, ship_config=ship_config)
+        get_attack = engine.get_attack
+
+        def timed_get_attack():
+            nonlocal slowest
+            start = time.perf_counter()
+            attack = get_attack()
+            slowest = max(slowest, time.perf_counter() - start)
+            return attack
+
+        engine.get_attack = timed_get_attack
         coordinator = TestCoordinator(engine, ships, debug=debug)
         await coordinator.run()
         print(f"Game finished with {coordinator.moves} moves")
@@ -557,8 +806,12 @@ async def test_engine(games: int):
     worst = max(history)
     mean = statistics.mean(history)
     print(f"Games: {len(history)} | Move Stats: [+{best}|-{worst}|÷{mean}]")
+    print(f"Slowest move: {slowest * 1000:.1f}ms")
 
 
 if __name__ == "__main__":
+    # engine.py [games] [parity|sampling] [board size]
     games = 50 if len(sys.argv) <= 1 else int(sys.argv[1])
-    asyncio.run(test_engine(games))
+    engine_class = ENGINES["parity" if len(sys.argv) <= 2 else sys.argv[2]]
+    size = 10 if len(sys.argv) <= 3 else int(sys.argv[3])
+    asyncio.run(test_engine(games, engine_class, size))
@@ -2,7 +2,6 @@ import itertools
 import operator
 import os
 import random
-import time
 from collections import Counter
 from dataclasses import asdict, dataclass
 from enum import Enum
@@ -375,15 +374,17 @@ def print_attack_board(state: List[List[CoordinateState]]):
 
 
 async def wait_for_state(session, url, game_id, state):
-    url = urljoin(url, f"/api/game/{game_id}/")
+    url = urljoin(url, f"/api/game/{game_id}/wait/")
+    params = {}
     while True:
-        async with session.get(url) as resp:
+        # the server holds the request until the game leaves the state we last saw
+        async with session.get(url, params=params) as resp:
             response = await resp.json()
             if response["game"]["state"] == "finished":
                 raise Exception("Game state is finished!")
             if response["game"]["state"] == state:
                 break
-        time.sleep(5)
+            params = dict(state=response["game"]["state"])
 
 
 async def play_game(url: str, token: str, game_id: str):
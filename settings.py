@@ -70,6 +70,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "cloudships.db.ConnectionHealthMiddleware",
+    "cloudships.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -111,6 +113,28 @@ TEMPLATES = [
 WSGI_APPLICATION = "cloudships.wsgi.application"
 
 DATABASES = {"default": env.db(default="postgres:///cloudships")}
+# seconds to keep a connection open between requests, 0 closes it after every request
+DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=0)
+# set to "pgbouncer" when DATABASE_URL points at pgbouncer in transaction pooling mode, which
+# can't keep a server side cursor open between transactions
+DATABASE_POOLER = env("DATABASE_POOLER", default=None)
+if DATABASE_POOLER == "pgbouncer":
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+# LISTEN needs a session to itself, so the game state listener connects here directly rather
+# than through the pooler, when set
+DATABASE_LISTEN_URL = env("DATABASE_LISTEN_URL", default=None)
+# the attack phase game state cache (board indexes and game status) is kept in each process,
+# unless GAME_CACHE_URL (e.g. memcache://127.0.0.1:11211) gives a cache they can share
+GAME_CACHE = None
+if env("GAME_CACHE_URL", default=None):
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "game": env.cache("GAME_CACHE_URL"),
+    }
+    GAME_CACHE = "game"
+GAME_CACHE_TTL = env.float("GAME_CACHE_TTL", default=3600)
+# connections idle for longer than this many seconds are checked before a request uses them
+DATABASE_HEALTH_CHECK_IDLE = env.float("DATABASE_HEALTH_CHECK_IDLE", default=30)
 
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -127,7 +151,26 @@ USE_TZ = True
 
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": ["rest_framework.authentication.TokenAuthentication"],
+    "DEFAULT_AUTHENTICATION_CLASSES": ["cloudships.authentication.CachedTokenAuthentication"],
 }
+# API tokens are cached per process for TOKEN_CACHE_TTL seconds. Deleting a token (or changing
+# its user) only takes effect immediately in the process that made the change, the others keep
+# accepting it until their cached copy expires, so lower this if that window is too long.
+TOKEN_CACHE_SIZE = env.int("TOKEN_CACHE_SIZE", default=1024)
+TOKEN_CACHE_TTL = env.float("TOKEN_CACHE_TTL", default=60)
 
 DISPATCH_URL = env("DISPATCH_URL", default="http:///")
+# seconds to wait on the dispatcher, and how many dispatches to send at once
+DISPATCH_TIMEOUT = env.float("DISPATCH_TIMEOUT", default=10)
+DISPATCH_CONCURRENCY = env.int("DISPATCH_CONCURRENCY", default=8)
+# failed dispatches are retried after DISPATCH_RETRY_DELAY seconds, doubling each attempt
+DISPATCH_MAX_ATTEMPTS = env.int("DISPATCH_MAX_ATTEMPTS", default=5)
+DISPATCH_RETRY_DELAY = env.float("DISPATCH_RETRY_DELAY", default=2)
+# a sent game without a finish callback stops counting against BotServer.max_concurrent_games
+# after DISPATCH_SLOT_TIMEOUT seconds
+DISPATCH_SLOT_TIMEOUT = env.float("DISPATCH_SLOT_TIMEOUT", default=600)
+
+# request metrics are served at /metrics/ to these addresses
+METRICS_ALLOWED_IPS = env.list("METRICS_ALLOWED_IPS", default=["127.0.0.1", "::1"])
+# log requests slower than this many seconds, along with their SQL
+SLOW_REQUEST_SECONDS = env.float("SLOW_REQUEST_SECONDS", default=None)
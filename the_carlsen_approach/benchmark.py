@@ -0,0 +1,182 @@
+"""
+Times the placement density against the original list based counting on boards from simulated
+games, and checks they agree. "incremental" is the bot's running total (BoardState.placements),
+timed as the whole shot: recording the result and picking the next move.
+
+Also times finding the halo of a sunk ship (BoardState.halo) against scanning the whole board,
+as update_sunk_ship used to.
+
+    python benchmark.py [--samples 8] [--seed 0]
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+from collections import Counter
+
+import main
+
+
+FORMATS = {
+    10: [dict(length=5, count=1), dict(length=4, count=1), dict(length=3, count=2), dict(length=2, count=1)],
+    20: [dict(length=1, count=10), dict(length=4, count=1)],
+    30: [dict(length=5, count=2), dict(length=4, count=2), dict(length=3, count=4), dict(length=2, count=2)],
+}
+
+
+def legacy_coord_probabilities(bs):
+    """
+    The original implementation, a list entry per unit of weight.
+    """
+
+    def enumerate_ship_placements(ship_size):
+        coordinates = []
+        for x, y in bs.board_state:
+            for dx, dy in [(0, 1), (1, 0)]:
+                cells = []
+                valid_placement = True
+                if (x + dx * ship_size) <= bs.board_size and (y + dy * ship_size) <= bs.board_size:
+                    for step in range(ship_size):
+                        coord = (x + dx * step, y + dy * step)
+                        if bs.board_state[coord] in ['SUNK', 'MISS']:
+                            valid_placement = False
+                            break
+                        if bs.board_state[coord] != "HIT":
+                            surrounding_hits = [c for c in bs.surrounding_coords(coord) if bs.board_state[c] == "HIT"]
+                            cells.extend([coord] * (ship_size + len(surrounding_hits) * 10 * ship_size))
+                if valid_placement:
+                    coordinates.extend(cells)
+        return coordinates
+
+    all_coordinates = []
+    for length, count in bs.ships_alive.items():
+        ship_coordinates = enumerate_ship_placements(length)
+        for _ in range(count):
+            all_coordinates += ship_coordinates
+    return Counter(all_coordinates)
+
+
+class Opponent(object):
+    def __init__(self, board_size, ship_config):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ships = main.make_ship_placement(board_size, ship_config)
+        self.ships = [main.get_occupied_squares(main.DataShip(**ship)) for ship in ships]
+
+    def attack(self, x, y):
+        for ship in self.ships:
+            if (x, y) in ship:
+                ship.discard((x, y))
+                return dict(result="SUNK" if not ship else "HIT")
+        return dict(result="MISS")
+
+
+def play(board_size, samples):
+    """
+    Copies of the bot's board at `samples` points through a game against a random fleet, and the
+    mean time per shot.
+    """
+    config = dict(board_size=board_size, ship_config=FORMATS[board_size])
+    opponent = Opponent(board_size, config["ship_config"])
+    bs = main.BoardState()
+    bs.init(None, None, None, config)
+    boards = []
+    elapsed = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        x, y = bs.next_move()
+        while True:
+            elapsed += time.perf_counter() - start
+            boards.append((dict(bs.board_state), dict(bs.ships_alive), bs.placements.as_counter()))
+            result = opponent.attack(x, y)
+            start = time.perf_counter()
+            bs.set_board_state(result, x, y)
+            if not bs.ships_alive:
+                break
+            x, y = bs.next_move()
+    step = max(1, len(boards) // samples)
+    return boards[::step][:samples], elapsed / len(boards) * 1000
+
+
+def legacy_halo(bs):
+    """
+    Every unknown cell next to any sunk cell, by checking every cell on the board.
+    """
+    return {
+        coord
+        for coord in bs.board_state
+        if bs.board_state[coord] not in ["SUNK", "HIT"]
+        and any(bs.board_state[c] == "SUNK" for c in bs.surrounding_coords(coord))
+        and bs.board_state[coord] != "MISS"
+    }
+
+
+def run_halo(board_size, repeat=20):
+    """
+    Sink each ship of a random fleet in turn, timing its halo both ways.
+    """
+    config = dict(board_size=board_size, ship_config=FORMATS[board_size])
+    opponent = Opponent(board_size, config["ship_config"])
+    bs = main.BoardState()
+    bs.init(None, None, None, config)
+    totals = Counter()
+    for ship in opponent.ships:
+        for coord in ship:
+            bs.set_state(coord, "SUNK")
+        elapsed, halo = timed(lambda: bs.halo(ship), repeat)
+        totals["targeted"] += elapsed
+        elapsed, expected = timed(lambda: legacy_halo(bs), repeat)
+        totals["full scan"] += elapsed
+        assert halo == expected, f"halo disagrees on a {board_size}x{board_size} board"
+        for coord in halo:
+            bs.set_state(coord, "MISS")
+    print(
+        f"{board_size}x{board_size} halo: "
+        + ", ".join(f"{name} {total / len(opponent.ships) * 1000:.1f}us" for name, total in totals.items())
+        + " per sunk ship"
+    )
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def run(samples, seed):
+    random.seed(seed)
+    engines = [("python", main.density_python)]
+    if main.np is not None:
+        engines.append(("numpy", main.density_numpy))
+    for board_size in sorted(FORMATS):
+        totals = Counter()
+        boards, totals["incremental"] = play(board_size, samples)
+        totals["incremental"] *= len(boards)
+        for board_state, ships_alive, incremental in boards:
+            bs = main.BoardState()
+            bs.init(None, None, None, dict(board_size=board_size, ship_config=FORMATS[board_size]))
+            bs.board_state, bs.ships_alive = board_state, ships_alive
+            elapsed, expected = timed(lambda: legacy_coord_probabilities(bs), 1)
+            totals["legacy"] += elapsed
+            assert incremental == expected, f"incremental disagrees on a {board_size}x{board_size} board"
+            for name, engine in engines:
+                main.density = engine
+                elapsed, result = timed(bs.get_coord_probabilities, 5)
+                totals[name] += elapsed
+                assert result == expected, f"{name} disagrees on a {board_size}x{board_size} board"
+        print(
+            f"{board_size}x{board_size}: "
+            + ", ".join(f"{name} {total / len(boards):.2f}ms" for name, total in totals.items())
+            + " per move"
+        )
+    for board_size in sorted(FORMATS):
+        run_halo(board_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=8, help="Boards per size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.samples, args.seed)
@@ -1,10 +1,10 @@
+import heapq
 import itertools
 import json
 import operator
 import os
 import random
 import sys
-import time
 from collections import Counter
 from dataclasses import asdict, dataclass
 from urllib.parse import urljoin
@@ -16,6 +16,12 @@ log = logging.getLogger(__name__)
 
 from flask import Flask, request, jsonify
 
+try:
+    import numpy as np
+except ImportError:
+    # density_python gives the same numbers, just slower
+    np = None
+
 app = Flask(__name__)
 
 # Copied for your convenience
@@ -137,6 +143,215 @@ def phase_place(session, url, game_id, config):
     session.post(urljoin(url, f"/api/game/{game_id}/place/"), json=ships)
 
 
+BLOCKED = ("SUNK", "MISS")
+
+
+def line_cover(blocked, length):
+    """
+    For each cell of a line, the number of placements of a ship of `length` along the line that
+    cover it without covering a blocked cell.
+    """
+    n = len(blocked)
+    if length > n:
+        return [0] * n
+    # seen[i] = blocked cells before i, valid[i] = valid placements starting before i
+    seen = [0]
+    for b in blocked:
+        seen.append(seen[-1] + b)
+    valid = [0]
+    for i in range(n - length + 1):
+        valid.append(valid[-1] + (seen[i + length] == seen[i]))
+    return [valid[min(j, n - length) + 1] - valid[max(0, j - length + 1)] for j in range(n)]
+
+
+def density_python(blocked, hit, ships_alive):
+    """
+    How strongly each cell is suggested by the placements of the ships still alive. `blocked`
+    (MISS or SUNK) and `hit` are indexed [x][y].
+
+    Every placement that avoids blocked cells adds `length` to each of its cells that isn't a hit,
+    plus `10 * length` for each hit next to that cell, once per ship of that length alive.
+    """
+    size = len(blocked)
+    cover = [[0] * size for _ in range(size)]
+    for length, count in ships_alive.items():
+        weight = length * count
+        for x in range(size):
+            for y, c in enumerate(line_cover(blocked[x], length)):
+                cover[x][y] += weight * c
+        for y in range(size):
+            for x, c in enumerate(line_cover([blocked[x][y] for x in range(size)], length)):
+                cover[x][y] += weight * c
+
+    density = [[0] * size for _ in range(size)]
+    for x in range(size):
+        for y in range(size):
+            if blocked[x][y] or hit[x][y]:
+                continue
+            hits = sum(
+                hit[nx][ny]
+                for nx, ny in [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]
+                if 0 <= nx < size and 0 <= ny < size
+            )
+            density[x][y] = cover[x][y] * (1 + 10 * hits)
+    return density
+
+
+def line_cover_numpy(blocked, length):
+    """
+    line_cover for every row of a 2d array at once.
+    """
+    rows, n = blocked.shape
+    if length > n:
+        return np.zeros((rows, n), dtype=np.int64)
+    seen = np.zeros((rows, n + 1), dtype=np.int64)
+    np.cumsum(blocked, axis=1, out=seen[:, 1:])
+    valid = np.zeros((rows, n - length + 2), dtype=np.int64)
+    np.cumsum(seen[:, length:] == seen[:, :-length], axis=1, out=valid[:, 1:])
+    j = np.arange(n)
+    return valid[:, np.minimum(j, n - length) + 1] - valid[:, np.maximum(0, j - length + 1)]
+
+
+def density_numpy(blocked, hit, ships_alive):
+    """
+    density_python with array operations.
+    """
+    blocked = np.asarray(blocked, dtype=bool)
+    hit = np.asarray(hit, dtype=bool)
+    cover = np.zeros(blocked.shape, dtype=np.int64)
+    for length, count in ships_alive.items():
+        # vertical placements run along y (axis 1), horizontal ones along x
+        vertical = line_cover_numpy(blocked, length)
+        horizontal = line_cover_numpy(blocked.T, length).T
+        cover += length * count * (vertical + horizontal)
+    hits = np.zeros(hit.shape, dtype=np.int64)
+    hits[1:, :] += hit[:-1, :]
+    hits[:-1, :] += hit[1:, :]
+    hits[:, 1:] += hit[:, :-1]
+    hits[:, :-1] += hit[:, 1:]
+    return np.where(blocked | hit, 0, cover * (1 + 10 * hits))
+
+
+density = density_numpy if np is not None else density_python
+
+
+class PlacementCounts(object):
+    """
+    The same numbers as `density`, kept up to date as cells are blocked or hit rather than
+    recomputed, so each shot only touches the placements through the cells it changed.
+    """
+
+    def __init__(self, board_size, ships_alive):
+        self.size = board_size
+        self.counts = dict(ships_alive)
+        self.blocked = [[False] * board_size for _ in range(board_size)]
+        self.hit = [[False] * board_size for _ in range(board_size)]
+        self.hits_around = [[0] * board_size for _ in range(board_size)]
+        # length -> number of unblocked placements (both orientations) covering each cell
+        self.cover = {}
+        for length in self.counts:
+            cover = [[0] * board_size for _ in range(board_size)]
+            for i in range(board_size):
+                line = [False] * board_size
+                for j, c in enumerate(line_cover(line, length)):
+                    cover[i][j] += c
+                    cover[j][i] += c
+            self.cover[length] = cover
+        # sum of length * count * cover over the lengths
+        self.weight = [[0] * board_size for _ in range(board_size)]
+        self.heap = []
+        self.rebuild()
+
+    def rebuild(self):
+        for x in range(self.size):
+            for y in range(self.size):
+                self.weight[x][y] = sum(
+                    length * self.counts[length] * cover[x][y] for length, cover in self.cover.items()
+                )
+        # max heap on density, ties to the lowest (x, y). Entries go stale as densities change,
+        # and are dropped when they reach the top.
+        self.heap = [(-self[(x, y)], x, y) for x in range(self.size) for y in range(self.size)]
+        heapq.heapify(self.heap)
+
+    def __getitem__(self, coord):
+        x, y = coord
+        if self.blocked[x][y] or self.hit[x][y]:
+            return 0
+        return self.weight[x][y] * (1 + 10 * self.hits_around[x][y])
+
+    def __contains__(self, coord):
+        return self[coord] > 0
+
+    def as_counter(self):
+        return Counter(
+            {(x, y): self[(x, y)] for x in range(self.size) for y in range(self.size) if (x, y) in self}
+        )
+
+    def best(self):
+        while self.heap:
+            weight, x, y = self.heap[0]
+            if weight < 0 and -weight == self[(x, y)]:
+                return x, y
+            heapq.heappop(self.heap)
+        return None
+
+    def changed(self, cells):
+        for x, y in cells:
+            heapq.heappush(self.heap, (-self[(x, y)], x, y))
+
+    def neighbours(self, x, y):
+        return [
+            (nx, ny)
+            for nx, ny in [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]
+            if 0 <= nx < self.size and 0 <= ny < self.size
+        ]
+
+    def set_hit(self, x, y, hit):
+        if self.hit[x][y] == hit:
+            return
+        self.hit[x][y] = hit
+        for nx, ny in self.neighbours(x, y):
+            self.hits_around[nx][ny] += 1 if hit else -1
+        self.changed([(x, y)] + self.neighbours(x, y))
+
+    def block(self, x, y):
+        """
+        Drop every placement through (x, y) that wasn't already blocked.
+        """
+        if self.blocked[x][y]:
+            return
+        self.blocked[x][y] = True
+        # a SUNK cell stops counting as a hit
+        self.set_hit(x, y, False)
+        changed = {(x, y)}
+        for length, cover in self.cover.items():
+            weight = length * self.counts[length]
+            for dx, dy in [(0, 1), (1, 0)]:
+                for offset in range(length):
+                    ox, oy = x - dx * offset, y - dy * offset
+                    if ox < 0 or oy < 0 or ox + dx * (length - 1) >= self.size or oy + dy * (length - 1) >= self.size:
+                        continue
+                    cells = [(ox + dx * i, oy + dy * i) for i in range(length)]
+                    if any(self.blocked[cx][cy] for cx, cy in cells if (cx, cy) != (x, y)):
+                        continue
+                    for cx, cy in cells:
+                        cover[cx][cy] -= 1
+                        self.weight[cx][cy] -= weight
+                    changed.update(cells)
+        self.changed(changed)
+
+    def set_count(self, length, count):
+        """
+        A ship of `length` sank, which changes every cell it could have covered.
+        """
+        if count:
+            self.counts[length] = count
+        else:
+            self.counts.pop(length, None)
+            self.cover.pop(length, None)
+        self.rebuild()
+
+
 class BoardState(object):
     def init(self, session, url, game_id, config):
         self.config = config
@@ -150,6 +365,7 @@ class BoardState(object):
             for y in range(self.board_size):
                 self.board_state[(x, y)] = None
         self.ships_alive = {x['length']: x['count'] for x in config["ship_config"]}
+        self.placements = PlacementCounts(self.board_size, self.ships_alive)
         self.history = []
         self.hit_mode = None
 
@@ -168,8 +384,15 @@ class BoardState(object):
         self.set_board_state(response.json(), x, y)
         return len(self.ships_alive.keys()) > 0
 
+    def set_state(self, coord, state):
+        self.board_state[coord] = state
+        if state in BLOCKED:
+            self.placements.block(*coord)
+        elif state == "HIT":
+            self.placements.set_hit(*coord, True)
+
     def set_board_state(self, response, x, y):
-        self.board_state[(x, y)] = response["result"]
+        self.set_state((x, y), response["result"])
         if response["result"] == "MISS":
             self.board[x][y] = " o "
         else:
@@ -188,98 +411,72 @@ class BoardState(object):
         x, y = coord
         return [c for c in [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)] if self.in_bounds(c)]
 
+    def halo(self, ship):
+        """
+        The unknown cells next to (not diagonally) the cells of a sunk ship. Ships can't touch,
+        so these are misses.
+        """
+        return {c for coord in ship for c in self.surrounding_coords(coord) if self.board_state[c] is None}
+
     def update_sunk_ship(self, x, y):
         self.hit_mode = None
+        ship = [(x, y)]
         size = 1
         c = 1
         while self.board_state.get((x + c, y)) == "HIT":
             size += 1
-            self.board_state[(x + c, y)] = "SUNK"
+            self.set_state((x + c, y), "SUNK")
+            ship.append((x + c, y))
             self.board[x + c][y] = " S "
             c += 1
 
         c = 1
         while self.board_state.get((x - c, y)) == "HIT":
             size += 1
-            self.board_state[(x - c, y)] = "SUNK"
+            self.set_state((x - c, y), "SUNK")
+            ship.append((x - c, y))
             self.board[x - c][y] = " S "
             c += 1
 
         c = 1
         while self.board_state.get((x, y + c)) == "HIT":
             size += 1
-            self.board_state[(x, y + c)] = "SUNK"
+            self.set_state((x, y + c), "SUNK")
+            ship.append((x, y + c))
             self.board[x][y + c] = " S "
             c += 1
 
         c = 1
         while self.board_state.get((x, y - c)) == "HIT":
             size += 1
-            self.board_state[(x, y - c)] = "SUNK"
+            self.set_state((x, y - c), "SUNK")
+            ship.append((x, y - c))
             self.board[x][y - c] = " S "
             c += 1
 
-        for coord in self.board_state:
-            is_sunk_in_surrrounding = any([self.board_state[x] == "SUNK" for x in self.surrounding_coords(coord)])
-            if self.board_state[coord] not in ["SUNK", "HIT"] and is_sunk_in_surrrounding:
-                self.board_state[coord] = "MISS"
-                self.board[coord[0]][coord[1]] = ' o '
+        for coord in self.halo(ship):
+            self.set_state(coord, "MISS")
+            self.board[coord[0]][coord[1]] = ' o '
 
         self.ships_alive[size] = self.ships_alive[size] - 1
         print(f"sunk_ship_size={size}")
+        self.placements.set_count(size, self.ships_alive[size])
         if self.ships_alive[size] == 0:
             self.ships_alive.pop(size)
 
         print(f"ships_alive={self.ships_alive}")
 
-    def enumerate_ship_placements(self, ship_size):
-        print(f'finding placements for ship size={ship_size}')
-        coordinates = []  # list of coordinates with duplicates expected
-        for x, y in self.board_state:
-            down = []
-            valid_placement = True
-            if (y + ship_size) <= self.config["board_size"]:
-                for step in range(ship_size):
-                    coord = (x, y + step)
-                    if self.board_state[coord] in ['SUNK', 'MISS']:
-                        valid_placement = False
-                        break
-                    if self.board_state[coord] != "HIT":
-                        for _ in range(ship_size):
-                            down.append(coord)
-                        surrounding_hits = [x for x in self.surrounding_coords(coord) if self.board_state[x] == "HIT"]
-                        for _ in range(len(surrounding_hits) * 10 * ship_size):
-                            down.append(coord)
-
-            if valid_placement:
-                coordinates.extend(down)
-
-            right = []
-            valid_placement = True
-            if (x + ship_size) <= self.board_size:
-                for step in range(ship_size):
-                    coord = (x + step, y)
-                    if self.board_state[coord] in ['SUNK', 'MISS']:
-                        valid_placement = False
-                        break
-                    if self.board_state[coord] != "HIT":
-                        for _ in range(ship_size):
-                            right.append(coord)
-                        surrounding_hits = [x for x in self.surrounding_coords(coord) if self.board_state[x] == "HIT"]
-                        for _ in range(len(surrounding_hits) * 10 * ship_size):
-                            right.append(coord)
-
-            if valid_placement:
-                coordinates.extend(right)
-        return coordinates
-
     def get_coord_probabilities(self):
-        all_coordinates = []
-        for length, count in self.ships_alive.items():
-            ship_coordinates = self.enumerate_ship_placements(length)
-            for _ in range(count):
-                all_coordinates += ship_coordinates
-        return Counter(all_coordinates)
+        """
+        The placement density recomputed from scratch, see `placements` for the running total.
+        """
+        size = self.board_size
+        blocked = [[self.board_state[(x, y)] in BLOCKED for y in range(size)] for x in range(size)]
+        hit = [[self.board_state[(x, y)] == "HIT" for y in range(size)] for x in range(size)]
+        weights = density(blocked, hit, self.ships_alive)
+        return Counter(
+            {(x, y): int(weights[x][y]) for x in range(size) for y in range(size) if weights[x][y] > 0}
+        )
 
     def direction(self, c1, c2):
         x1, y1 = c1
@@ -313,7 +510,7 @@ class BoardState(object):
             more_than_one_hit = len(hit_coords) > 1
 
         if not more_than_one_hit:
-            candidates = [x for x in self.surrounding_coords(first_hit_coord) if x in list(coord_counter)]
+            candidates = [x for x in self.surrounding_coords(first_hit_coord) if x in coord_counter]
             candidates.sort(key=lambda x: coord_counter[x], reverse=True)
             next_coord = candidates[0]
             hit_direction = self.direction(next_coord, first_hit_coord)
@@ -322,7 +519,7 @@ class BoardState(object):
             return next_coord
 
         candidates = [x for coord in hit_coords for x in self.get_direction_coords(coord, hit_direction) if
-                      x in list(coord_counter)]
+                      x in coord_counter]
         if len(candidates) > 0:
             candidates.sort(key=lambda x: coord_counter[x], reverse=True)
             next_coord = candidates[0]
@@ -332,17 +529,20 @@ class BoardState(object):
         hit_direction = self.opposite_direction(hit_direction)
         self.hit_mode = (first_hit_coord, first_hit_move_index, hit_direction)
         candidates = [x for coord in hit_coords for x in
-                      self.get_direction_coords(coord, hit_direction) if x in list(coord_counter)]
+                      self.get_direction_coords(coord, hit_direction) if x in coord_counter]
         candidates.sort(key=lambda x: coord_counter[x], reverse=True)
         next_coord = candidates[0]
         return next_coord
 
     def next_move(self):
-        coord_counter = self.get_coord_probabilities()
         print(f"ships_alive={self.ships_alive}")
         if self.hit_mode or (self.history and self.history[-1]["result"] == "HIT"):
-            return self.get_hit_mode_move(coord_counter)
-        return coord_counter.most_common(1)[0][0]
+            return self.get_hit_mode_move(self.placements)
+        best = self.placements.best()
+        if best is None:
+            # nothing fits, so the remaining ships are somewhere we've ruled out
+            return next(coord for coord, state in self.board_state.items() if state is None)
+        return best
 
 
 def phase_attack(session, url, game_id, config):
@@ -361,11 +561,13 @@ def phase_attack(session, url, game_id, config):
 
 
 def wait_for_state(session, url, game_id, state):
+    params = {}
     while True:
-        response = session.get(urljoin(url, f"/api/game/{game_id}/")).json()
+        # the server holds the request until the game leaves the state we last saw
+        response = session.get(urljoin(url, f"/api/game/{game_id}/wait/"), params=params).json()
         if response["game"]["state"] == state:
             break
-        time.sleep(5)
+        params = dict(state=response["game"]["state"])
 
 
 def play_game(url: str, token: str, game_id: str):